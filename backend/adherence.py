@@ -0,0 +1,112 @@
+"""
+HealthMate AI Guardian - Medication adherence
+Records scheduled doses as taken, late or skipped and keeps per-user counters
+(all-time and per ISO week) up to date on every event, so adherence rates and
+streaks are read in O(1) instead of being recomputed from dose history.
+"""
+
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+ADHERENCE_MAX_RETRIES = int(os.getenv("ADHERENCE_MAX_RETRIES", "5"))
+
+DOSE_STATUSES = ("taken", "late", "skipped")
+ALL_TIME = "all"
+
+COUNTER_FIELDS = ("doses_total", "doses_taken", "doses_late", "doses_skipped", "current_streak", "best_streak")
+
+def week_period(moment: datetime) -> str:
+    """ISO week a dose belongs to, e.g. '2024-W07'"""
+    year, week, _ = moment.isocalendar()
+    return f"{year}-W{week:02d}"
+
+def empty_counters(user_id: int, period: str) -> dict:
+    return {"user_id": user_id, "period": period, "version": 0, **{field: 0 for field in COUNTER_FIELDS}}
+
+def apply_dose(counters: dict, new_status: str, old_status: Optional[str] = None) -> dict:
+    """Counters after one dose event; ``old_status`` is set when a dose is re-marked
+
+    Streaks follow doses in the order they are recorded: a taken dose extends
+    the current streak, a late or skipped one ends it. Re-marking a dose only
+    corrects the totals. The record_dose_event database function applies the
+    same rules.
+    """
+    updated = dict(counters)
+    if old_status:
+        updated[f"doses_{old_status}"] -= 1
+    else:
+        updated["doses_total"] += 1
+        updated["current_streak"] = updated["current_streak"] + 1 if new_status == "taken" else 0
+        updated["best_streak"] = max(updated["best_streak"], updated["current_streak"])
+    updated[f"doses_{new_status}"] += 1
+    return updated
+
+def adherence_summary(counters: Optional[dict]) -> dict:
+    counters = counters or {}
+    total = counters.get("doses_total", 0)
+    taken = counters.get("doses_taken", 0)
+    late = counters.get("doses_late", 0)
+    return {
+        "doses_total": total,
+        "doses_taken": taken,
+        "doses_late": late,
+        "doses_skipped": counters.get("doses_skipped", 0),
+        "on_time_rate": round(100 * taken / total, 1) if total else None,
+        "adherence_rate": round(100 * (taken + late) / total, 1) if total else None,
+        "current_streak": counters.get("current_streak", 0),
+        "best_streak": counters.get("best_streak", 0),
+    }
+
+class AdherenceTracker:
+    """Dose events plus incrementally maintained adherence_counters rows
+
+    Each event is stored and folded into the counters by the record_dose_event
+    database function, in one transaction, so concurrent or retried marks of a
+    dose are counted exactly once. rebuild_adherence_counters.py recomputes the
+    counters from dose_events should they ever drift.
+    """
+
+    def __init__(self, supabase):  # async data client (see data_client.py)
+        self.supabase = supabase
+        self.events = 0
+
+    async def record(self, user_id: int, medication_id: int, scheduled_for: datetime, status: str) -> dict:
+        """Store a dose event and fold it into the user's counters"""
+        result = await self.supabase.rpc("record_dose_event", {
+            "p_user_id": user_id,
+            "p_medication_id": medication_id,
+            "p_scheduled_for": scheduled_for.isoformat(),
+            "p_status": status,
+            "p_week": week_period(scheduled_for),
+        }).execute()
+        self.events += 1
+        return result.data[0]
+
+    async def counters(self, user_ids: List[int], periods: List[str]) -> Dict[tuple, dict]:
+        """Counter rows keyed by (user_id, period), one query for any number of users"""
+        rows = (
+            await self.supabase.table("adherence_counters")
+            .select("*")
+            .in_("user_id", user_ids)
+            .in_("period", periods)
+            .execute()
+        ).data or []
+        return {(row["user_id"], row["period"]): row for row in rows}
+
+    async def summary(self, user_id: int, now: Optional[datetime] = None) -> dict:
+        """All-time and current-week adherence for one user"""
+        this_week = week_period(now or datetime.utcnow())
+        rows = await self.counters([user_id], [ALL_TIME, this_week])
+        return {
+            "all_time": adherence_summary(rows.get((user_id, ALL_TIME))),
+            "this_week": adherence_summary(rows.get((user_id, this_week))),
+        }
+
+    def stats(self) -> dict:
+        return {"events": self.events}
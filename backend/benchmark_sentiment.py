@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+HealthMate AI Guardian - Sentiment Backend Benchmark
+Compares latency, throughput and memory of the torch and ONNX Runtime backends
+
+Usage:
+    python benchmark_sentiment.py                       # every backend
+    python benchmark_sentiment.py --backend onnx-int8   # a single backend
+    python benchmark_sentiment.py --parity              # ONNX vs torch outputs
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SAMPLE_TEXTS = [
+    "Feeling great today! Had a good walk in the morning.",
+    "Feeling a bit tired but overall okay.",
+    "I couldn't sleep at all and my back hurts.",
+    "ok",
+    "good",
+    "Feeling tired",
+    "Had lunch with my daughter, it was lovely",
+    "Everything feels overwhelming lately and I miss my friends",
+    "Not great, the new medication makes me dizzy",
+    "Pretty average day, nothing special happened",
+    "So happy the weather finally cleared up!",
+    "I'm worried about my appointment tomorrow",
+]
+
+BACKENDS = ["torch", "onnx", "onnx-int8"]
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+
+def load_backend(backend: str, model_name: str):
+    if backend == "torch":
+        from transformers import pipeline
+        return pipeline("sentiment-analysis", model=model_name)
+    from sentiment_onnx import OnnxSentimentPipeline
+    return OnnxSentimentPipeline(model_name, quantize=backend == "onnx-int8")
+
+def run_backend(backend: str, model_name: str, runs: int, batch_size: int) -> dict:
+    """Benchmark one backend in the current process"""
+    started = time.perf_counter()
+    scorer = load_backend(backend, model_name)
+    load_seconds = time.perf_counter() - started
+
+    # Warm up
+    scorer(SAMPLE_TEXTS[:2], batch_size=2, truncation=True)
+
+    # Single-text latency
+    latencies = []
+    for i in range(runs):
+        text = SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]
+        started = time.perf_counter()
+        scorer([text], batch_size=1, truncation=True)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+
+    # Batched throughput
+    batch = [SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)] for i in range(batch_size)]
+    rounds = max(1, runs // batch_size)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        scorer(batch, batch_size=batch_size, truncation=True)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "backend": backend,
+        "load_seconds": round(load_seconds, 2),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        "throughput_per_s": round(rounds * batch_size / elapsed, 1),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sentiment inference backends")
+    parser.add_argument("--model", default=os.getenv("SENTIMENT_MODEL", "distilbert-base-uncased-finetuned-sst-2-english"))
+    parser.add_argument("--backend", choices=BACKENDS + ["all"], default="all")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--parity", action="store_true", help="compare ONNX outputs against torch")
+    parser.add_argument("--json", action="store_true", help="print a single JSON result")
+    args = parser.parse_args()
+
+    if args.parity:
+        from sentiment_onnx import check_parity
+        for quantize in (False, True):
+            report = check_parity(SAMPLE_TEXTS, args.model, quantize=quantize)
+            print(json.dumps(report, indent=2))
+        return
+
+    if args.backend != "all":
+        result = run_backend(args.backend, args.model, args.runs, args.batch_size)
+        print(json.dumps(result) if args.json else result)
+        return
+
+    # Each backend runs in its own process so peak RSS is not shared
+    print(f"🏁 Benchmarking {args.model} ({args.runs} runs, batch size {args.batch_size})")
+    results = []
+    for backend in BACKENDS:
+        command = [
+            sys.executable, os.path.abspath(__file__),
+            "--model", args.model, "--backend", backend,
+            "--runs", str(args.runs), "--batch-size", str(args.batch_size), "--json",
+        ]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"⚠️  {backend} failed: {completed.stderr.strip().splitlines()[-1:]}")
+            continue
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    header = f"{'backend':<10} {'load s':>8} {'p50 ms':>8} {'p95 ms':>8} {'texts/s':>9} {'RSS MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['backend']:<10} {r['load_seconds']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8} "
+              f"{r['throughput_per_s']:>9} {str(r['peak_rss_mb']):>8}")
+
+if __name__ == "__main__":
+    main()
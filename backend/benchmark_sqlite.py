@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+HealthMate AI Guardian - SQLite Benchmark
+Compares read and write latency of the local backend's SQLite database with
+default settings against the tuned mode from database.py (WAL, pragmas,
+composite indexes), on a synthetic vitals table
+
+Usage:
+    python benchmark_sqlite.py                      # 1M rows, both modes
+    python benchmark_sqlite.py --rows 100000 --mode tuned
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from database import Vital, create_db_engine, migrate
+
+MODES = ["default", "tuned"]
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    return {
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(latencies[max(0, int(len(latencies) * 0.95) - 1)], 3),
+    }
+
+def timed(func, runs: int):
+    latencies = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return percentiles(latencies)
+
+def load_rows(engine, rows: int, users: int):
+    """Bulk-load synthetic vitals spread over the last year"""
+    start = datetime.utcnow() - timedelta(days=365)
+    step = timedelta(days=365) / max(1, rows)
+    chunk = 50_000
+    with engine.begin() as connection:
+        for offset in range(0, rows, chunk):
+            connection.execute(Vital.__table__.insert(), [
+                {
+                    "user_id": random.randint(1, users),
+                    "blood_pressure_systolic": random.randint(100, 160),
+                    "blood_pressure_diastolic": random.randint(60, 100),
+                    "blood_sugar": round(random.uniform(4, 10), 1),
+                    "sleep_hours": round(random.uniform(4, 9), 1),
+                    "created_at": start + step * i,
+                }
+                for i in range(offset, min(rows, offset + chunk))
+            ])
+
+def run_mode(mode: str, rows: int, users: int, reads: int, writes: int) -> dict:
+    workdir = tempfile.mkdtemp(prefix="healthmate-bench-")
+    path = os.path.join(workdir, f"{mode}.db")
+    engine = create_db_engine(f"sqlite:///{path}", tuned=mode == "tuned")
+    migrate(engine)
+    if mode == "default":
+        # The schema as it was before tuning: no composite indexes
+        with engine.begin() as connection:
+            for table in ("medications", "mood_logs", "vitals"):
+                connection.execute(text(f"DROP INDEX IF EXISTS ix_{table}_user_created"))
+
+    started = time.perf_counter()
+    load_rows(engine, rows, users)
+    load_seconds = time.perf_counter() - started
+    if mode == "tuned":
+        with engine.connect() as connection:
+            connection.execute(text("PRAGMA optimize"))
+
+    Session = sessionmaker(bind=engine)
+    db = Session()
+
+    # The queries main.py issues per request
+    def dashboard_read():
+        user_id = random.randint(1, users)
+        db.query(Vital).filter(Vital.user_id == user_id).order_by(Vital.created_at.desc()).limit(5).all()
+
+    def history_read():
+        user_id = random.randint(1, users)
+        db.query(Vital).filter(Vital.user_id == user_id).order_by(Vital.created_at.desc()).all()
+
+    def single_write():
+        db.add(Vital(user_id=random.randint(1, users), blood_sugar=5.5))
+        db.commit()
+
+    result = {
+        "mode": mode,
+        "rows": rows,
+        "load_rows_per_s": round(rows / load_seconds),
+        "dashboard_read": timed(dashboard_read, reads),
+        "history_read": timed(history_read, reads),
+        "single_write": timed(single_write, writes),
+    }
+    db.close()
+    engine.dispose()
+    shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local SQLite database")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--reads", type=int, default=200)
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--mode", choices=MODES + ["all"], default="all")
+    args = parser.parse_args()
+
+    random.seed(42)
+    modes = MODES if args.mode == "all" else [args.mode]
+    print(f"🏁 Benchmarking SQLite with {args.rows:,} vitals rows over {args.users:,} users")
+
+    header = f"{'mode':<8} {'load rows/s':>12} {'dash p50':>9} {'dash p95':>9} {'hist p50':>9} {'hist p95':>9} {'write p50':>10} {'write p95':>10}"
+    results = [run_mode(mode, args.rows, args.users, args.reads, args.writes) for mode in modes]
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['mode']:<8} {r['load_rows_per_s']:>12} "
+              f"{r['dashboard_read']['p50_ms']:>9} {r['dashboard_read']['p95_ms']:>9} "
+              f"{r['history_read']['p50_ms']:>9} {r['history_read']['p95_ms']:>9} "
+              f"{r['single_write']['p50_ms']:>10} {r['single_write']['p95_ms']:>10}")
+    print("(latencies in ms)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+HealthMate AI Guardian - Async Supabase data client
+PostgREST access over one shared httpx.AsyncClient, so handlers await the
+database instead of blocking the event loop. Connections are kept alive in a
+bounded pool and use HTTP/2 when the optional ``h2`` package is installed.
+
+Queries are built exactly like the synchronous supabase client:
+
+    result = await db.table("users").select("*").eq("id", user_id).execute()
+"""
+
+import importlib.util
+import os
+from typing import Dict, Union
+
+import httpx
+from dotenv import load_dotenv
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+
+# Load environment variables
+load_dotenv()
+
+SUPABASE_POOL_MAX_CONNECTIONS = int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "20"))
+SUPABASE_POOL_MAX_KEEPALIVE = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "10"))
+SUPABASE_POOL_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_POOL_KEEPALIVE_EXPIRY", "30"))
+SUPABASE_HTTP2 = os.getenv("SUPABASE_HTTP2", "true").lower() == "true"
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+
+def http2_available() -> bool:
+    """httpx only speaks HTTP/2 with the h2 package installed"""
+    return importlib.util.find_spec("h2") is not None
+
+class AsyncDataClient(AsyncPostgrestClient):
+    """PostgREST client backed by a pooled, keep-alive httpx.AsyncClient"""
+
+    def __init__(
+        self,
+        supabase_url: str,
+        supabase_key: str,
+        max_connections: int = SUPABASE_POOL_MAX_CONNECTIONS,
+        max_keepalive: int = SUPABASE_POOL_MAX_KEEPALIVE,
+        keepalive_expiry: float = SUPABASE_POOL_KEEPALIVE_EXPIRY,
+        http2: bool = SUPABASE_HTTP2,
+        timeout: float = SUPABASE_TIMEOUT,
+    ):
+        # Read by create_session, which the base constructor calls
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2 and http2_available()
+        self.requests = 0
+
+        headers = {
+            **DEFAULT_POSTGREST_CLIENT_HEADERS,
+            "apiKey": supabase_key,
+            "Authorization": f"Bearer {supabase_key}",
+        }
+        super().__init__(f"{supabase_url.rstrip('/')}/rest/v1", headers=headers, timeout=timeout)
+
+    def create_session(self, base_url: str, headers: Dict[str, str],
+                       timeout: Union[int, float, httpx.Timeout]) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            limits=self.limits,
+            http2=self.http2,
+            event_hooks={"request": [self._count_request]},
+        )
+
+    async def _count_request(self, request: httpx.Request):
+        self.requests += 1
+
+    def stats(self) -> dict:
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry_seconds": self.limits.keepalive_expiry,
+            "requests": self.requests,
+        }
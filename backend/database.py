@@ -0,0 +1,156 @@
+"""
+HealthMate AI Guardian - SQLAlchemy database for the local backend (main.py)
+Engine, models and schema migration. SQLite runs in a tuned mode by default:
+WAL journaling, relaxed fsync, a larger page cache, memory-mapped reads and
+composite (user_id, created_at DESC) indexes matching every per-user query.
+
+Routes use the async engine (aiosqlite for SQLite, asyncpg for Postgres) so
+concurrent requests overlap their database waits; the sync engine is kept
+for migrations and offline tools.
+"""
+
+import os
+from datetime import datetime
+from typing import List
+
+from dotenv import load_dotenv
+from sqlalchemy import Boolean, Column, DateTime, Float, Index, Integer, String, Text, create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+# Load environment variables
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./healthmate.db")
+
+# SQLite tuning (ignored for other databases)
+SQLITE_TUNED = os.getenv("SQLITE_TUNED", "true").lower() == "true"
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # safe with WAL; FULL fsyncs every commit
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# Async engine connection pool
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# Async drivers for the plain URLs accepted in DATABASE_URL
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+Base = declarative_base()
+
+# Database Models
+class User(Base):
+    __tablename__ = "users"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    age = Column(Integer, nullable=False)
+    caregiver_email = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Medication(Base):
+    __tablename__ = "medications"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    name = Column(String, nullable=False)
+    dosage = Column(String, nullable=False)
+    reminder_times = Column(Text, nullable=False)  # JSON string of times
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (Index("ix_medications_user_created", user_id, created_at.desc()),)
+
+class MoodLog(Base):
+    __tablename__ = "mood_logs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    mood_text = Column(Text, nullable=False)
+    sentiment_score = Column(Float, nullable=False)
+    sentiment_label = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (Index("ix_mood_logs_user_created", user_id, created_at.desc()),)
+
+class Vital(Base):
+    __tablename__ = "vitals"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    blood_pressure_systolic = Column(Integer)
+    blood_pressure_diastolic = Column(Integer)
+    blood_sugar = Column(Float)
+    sleep_hours = Column(Float)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (Index("ix_vitals_user_created", user_id, created_at.desc()),)
+
+def sqlite_pragmas() -> List[str]:
+    """PRAGMA statements run on every new SQLite connection in tuned mode"""
+    return [
+        "PRAGMA journal_mode=WAL",  # readers no longer block the writer
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",  # negative = KiB
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record=None):
+    cursor = dbapi_connection.cursor()
+    for pragma in sqlite_pragmas():
+        cursor.execute(pragma)
+    cursor.close()
+
+def create_db_engine(url: str = DATABASE_URL, tuned: bool = SQLITE_TUNED) -> Engine:
+    if not url.startswith("sqlite"):
+        return create_engine(url)
+
+    db_engine = create_engine(url, connect_args={"check_same_thread": False})
+    if tuned:
+        event.listen(db_engine, "connect", apply_sqlite_pragmas)
+    return db_engine
+
+def async_database_url(url: str) -> str:
+    """Swap a plain database URL's driver for its asyncio counterpart"""
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+def create_async_db_engine(url: str = DATABASE_URL, tuned: bool = SQLITE_TUNED) -> AsyncEngine:
+    db_engine = create_async_engine(
+        async_database_url(url),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+    if url.startswith("sqlite") and tuned:
+        event.listen(db_engine.sync_engine, "connect", apply_sqlite_pragmas)
+    return db_engine
+
+def migrate(db_engine: Engine):
+    """Create missing tables, then indexes added to tables that already exist"""
+    Base.metadata.create_all(bind=db_engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db_engine, checkfirst=True)
+    if db_engine.dialect.name == "sqlite":
+        with db_engine.connect() as connection:
+            connection.execute(text("PRAGMA optimize"))  # refresh planner statistics for new indexes
+
+engine = create_db_engine()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = create_async_db_engine()
+# Rows stay readable after commit without lazy reloads, which async sessions cannot do
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
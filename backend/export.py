@@ -0,0 +1,59 @@
+"""
+HealthMate AI Guardian - Full-history export
+Streams a user's vitals, mood logs and medications as NDJSON or CSV, paging
+through the database with the keyset cursor so memory stays flat however
+many years of data a user has.
+"""
+
+import csv
+import io
+import json
+import os
+from typing import AsyncIterator, List
+
+from pagination import PAGE_SIZE_MAX, paginate, split_page
+
+# Same cap as API pages: the look-ahead row must fit under Supabase's max-rows
+EXPORT_PAGE_SIZE = min(int(os.getenv("EXPORT_PAGE_SIZE", "999")), PAGE_SIZE_MAX)
+
+# Exportable tables and their CSV columns
+EXPORT_COLUMNS = {
+    "vitals": ["id", "user_id", "blood_pressure_systolic", "blood_pressure_diastolic",
+               "blood_sugar", "sleep_hours", "created_at"],
+    "mood_logs": ["id", "user_id", "mood_text", "sentiment_score", "sentiment_label",
+                  "sentiment_model", "created_at"],
+    "medications": ["id", "user_id", "name", "dosage", "reminder_times", "is_active", "created_at"],
+}
+
+async def iter_user_rows(db, table: str, user_id: int, page_size: int = EXPORT_PAGE_SIZE) -> AsyncIterator[dict]:
+    """Yield every row of a user's table, newest first, one page in memory at a time"""
+    cursor = None
+    while True:
+        query = paginate(db.table(table).select(",".join(EXPORT_COLUMNS[table])).eq("user_id", user_id),
+                         page_size, cursor)
+        rows, cursor = split_page((await query.execute()).data or [], page_size)
+        for row in rows:
+            yield row
+        if not cursor:
+            return
+
+async def ndjson_export(db, user_id: int, tables: List[str]) -> AsyncIterator[str]:
+    """One JSON object per line, tagged with its table"""
+    for table in tables:
+        async for row in iter_user_rows(db, table, user_id):
+            yield json.dumps({"table": table, **row}, default=str) + "\n"
+
+async def csv_export(db, user_id: int, table: str) -> AsyncIterator[str]:
+    """A header line and one CSV line per row"""
+    columns = EXPORT_COLUMNS[table]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    async for row in iter_user_rows(db, table, user_id):
+        writer.writerow([row.get(column) for column in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
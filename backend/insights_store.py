@@ -0,0 +1,215 @@
+"""
+HealthMate AI Guardian - Materialized insights
+Keeps one user_insights row per user, recomputed in the background after the
+writes that change it (mood logs, medications, dose events). A write marks
+the row dirty in the database, and the refresh loop of whichever API worker
+claims it first recomputes it. This is a rate limit, not a trailing debounce:
+the first write after a quiet spell is picked up on the next poll, and later
+writes wait until INSIGHTS_DEBOUNCE_SECONDS have passed since the last
+recompute. Reads are a single primary-key lookup.
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+from notifications import parse_timestamp
+
+# Load environment variables
+load_dotenv()
+
+INSIGHTS_DEBOUNCE_SECONDS = float(os.getenv("INSIGHTS_DEBOUNCE_SECONDS", "2"))
+INSIGHTS_TICK_INTERVAL = float(os.getenv("INSIGHTS_TICK_INTERVAL", "0.5"))
+# Idle polls back off from INSIGHTS_TICK_INTERVAL up to this; local writes still wake the loop
+INSIGHTS_IDLE_POLL_MAX = float(os.getenv("INSIGHTS_IDLE_POLL_MAX", "5"))
+INSIGHTS_LEASE_SECONDS = float(os.getenv("INSIGHTS_LEASE_SECONDS", "30"))
+INSIGHTS_REFRESH_BATCH = int(os.getenv("INSIGHTS_REFRESH_BATCH", "100"))
+# Mood insights cover the last 7 days, so rows are also recomputed once this old
+INSIGHTS_MAX_AGE_SECONDS = float(os.getenv("INSIGHTS_MAX_AGE_SECONDS", "86400"))
+
+class InsightsMaterializer:
+    """user_insights rows refreshed after write events, rate-limited per user
+
+    ``mark_dirty`` stamps ``dirty_at`` on the user's row. The refresh loop
+    picks dirty rows whose ``computed_at`` is at least ``debounce`` seconds
+    old and claims each with a compare-and-set on ``refresh_lease_until``,
+    like the outbox claims deliveries, so only one worker recomputes a user.
+    The result is stored and ``dirty_at`` and the lease cleared in one write,
+    with a compare-and-set so a mark made while computing survives. A failed
+    refresh keeps its mark and is retried once the lease expires. Reads
+    report ``stale`` while a row is dirty.
+    """
+
+    def __init__(
+        self,
+        supabase,  # async data client (see data_client.py)
+        compute: Callable[[int], Awaitable[dict]],
+        debounce: float = INSIGHTS_DEBOUNCE_SECONDS,
+        tick_interval: float = INSIGHTS_TICK_INTERVAL,
+        idle_poll_max: float = INSIGHTS_IDLE_POLL_MAX,
+        lease: float = INSIGHTS_LEASE_SECONDS,
+        max_age: float = INSIGHTS_MAX_AGE_SECONDS,
+        batch_size: int = INSIGHTS_REFRESH_BATCH,
+    ):
+        self.supabase = supabase
+        self.compute = compute
+        self.debounce = timedelta(seconds=debounce)
+        self.tick_interval = tick_interval
+        self.idle_poll_max = idle_poll_max
+        self.lease = timedelta(seconds=lease)
+        self.max_age = timedelta(seconds=max_age)
+        self.batch_size = batch_size
+        self._wake: Optional[asyncio.Event] = None
+
+        # Metrics
+        self.events = 0
+        self.refreshes = 0
+        self.claim_conflicts = 0
+        self.remarked = 0
+        self.reads = 0
+        self.read_misses = 0
+        self.errors = 0
+
+    async def mark_dirty(self, *user_ids: int):
+        """Flag users' insights for a refresh after a write; never fails the write
+
+        Users without a row yet need no mark: their first read computes it.
+        """
+        self.events += len(user_ids)
+        try:
+            await (
+                self.supabase.table("user_insights")
+                .update({"dirty_at": datetime.utcnow().isoformat()})
+                .in_("user_id", list(user_ids))
+                .execute()
+            )
+        except Exception as e:
+            self.errors += 1
+            print(f"Insights dirty mark error for users {list(user_ids)}: {e}")
+            return
+        if self._wake:
+            self._wake.set()
+
+    async def refresh(self, user_id: int, dirty_at: Optional[str] = None) -> dict:
+        """Recompute and store a user's insights now
+
+        ``dirty_at`` is the mark seen before computing; it is only cleared if
+        no newer mark replaced it in the meantime.
+        """
+        row = {
+            **await self.compute(user_id),
+            "user_id": user_id,
+            "computed_at": datetime.utcnow().isoformat(),
+        }
+        update = (
+            self.supabase.table("user_insights")
+            .update(dict(row, dirty_at=None, refresh_lease_until=None))
+            .eq("user_id", user_id)
+        )
+        update = update.eq("dirty_at", dirty_at) if dirty_at else update.is_("dirty_at", "null")
+        result = await update.execute()
+        if not result.data:
+            # No row yet, or re-marked while computing: store the result, keep any mark
+            await self.supabase.table("user_insights").upsert(dict(row, refresh_lease_until=None)).execute()
+            if dirty_at:
+                self.remarked += 1
+        self.refreshes += 1
+        return row
+
+    async def get(self, user_id: int, refresh: bool = False) -> dict:
+        """A user's stored insights; computed on the spot when forced, missing or too old"""
+        self.reads += 1
+        rows = (
+            await self.supabase.table("user_insights")
+            .select("*")
+            .eq("user_id", user_id)
+            .execute()
+        ).data
+        row = rows[0] if rows else None
+        if refresh or not row or datetime.utcnow() - parse_timestamp(row["computed_at"]) > self.max_age:
+            if not refresh:
+                self.read_misses += 1
+            return dict(await self.refresh(user_id, row and row.get("dirty_at")), stale=False)
+        row.pop("refresh_lease_until", None)
+        stale = row.pop("dirty_at", None) is not None
+        return dict(row, stale=stale)
+
+    async def due(self, now: datetime) -> list:
+        """Unclaimed dirty rows not recomputed within the rate limit, oldest mark first"""
+        query = (
+            self.supabase.table("user_insights")
+            .select("user_id,dirty_at,refresh_lease_until")
+            .not_.is_("dirty_at", "null")
+            .lte("computed_at", (now - self.debounce).isoformat())
+        )
+        # The pinned postgrest builder has no or_(), so the filter is added as a raw param
+        query.params = query.params.add(
+            "or", f'(refresh_lease_until.is.null,refresh_lease_until.lt."{now.isoformat()}")'
+        )
+        return (await query.order("dirty_at").limit(self.batch_size).execute()).data or []
+
+    async def _claim(self, row: dict, now: datetime) -> bool:
+        """Lease a dirty row to this worker; False if another worker claimed it first"""
+        update = (
+            self.supabase.table("user_insights")
+            .update({"refresh_lease_until": (now + self.lease).isoformat()})
+            .eq("user_id", row["user_id"])
+        )
+        lease = row.get("refresh_lease_until")
+        update = update.eq("refresh_lease_until", lease) if lease else update.is_("refresh_lease_until", "null")
+        claimed = bool((await update.execute()).data)
+        if not claimed:
+            self.claim_conflicts += 1
+        return claimed
+
+    async def refresh_due(self) -> int:
+        """Claim and recompute one batch of dirty users; returns users refreshed"""
+        now = datetime.utcnow()
+        refreshed = 0
+        for row in await self.due(now):
+            try:
+                if not await self._claim(row, now):
+                    continue
+                await self.refresh(row["user_id"], row["dirty_at"])
+                refreshed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print(f"Insights refresh error for user {row['user_id']}: {e}")
+        return refreshed
+
+    async def run(self):
+        """Refresh dirty users, whichever worker marked them, until cancelled"""
+        self._wake = asyncio.Event()
+        delay = self.tick_interval
+        while True:
+            try:
+                refreshed = await self.refresh_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print(f"Insights refresh poll error: {e}")
+                refreshed = 0
+
+            # Poll quickly while there is work, back off while there is none
+            delay = self.tick_interval if refreshed else min(delay * 2, self.idle_poll_max)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def stats(self) -> dict:
+        return {
+            "events": self.events,
+            "refreshes": self.refreshes,
+            "claim_conflicts": self.claim_conflicts,
+            "remarked": self.remarked,
+            "reads": self.reads,
+            "read_misses": self.read_misses,
+            "errors": self.errors,
+        }
@@ -1,16 +1,28 @@
-from fastapi import FastAPI, HTTPException
+import time
+_import_started = time.perf_counter()  # boot time reported by /ready
+
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
-from datetime import datetime, timedelta
-from typing import List, Optional
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, EmailStr, Field, ValidationError, field_validator
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Literal, Optional
+import asyncio
 import os
 from dotenv import load_dotenv
-from transformers import pipeline
 import json
-from supabase import create_client, Client
+from adherence import DOSE_STATUSES, AdherenceTracker
+from caching import TTLCache
+from data_client import AsyncDataClient
+from export import EXPORT_COLUMNS, csv_export, ndjson_export
+from insights_store import InsightsMaterializer
+from mood_state import MoodStateStore
+from notifications import NotificationOutbox, smtp_pool
+from pagination import NEXT_CURSOR_HEADER, PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX, paginate, split_page
+from reminders import REMINDER_NOTIFY_CAREGIVER, ReminderScheduler
+from sentiment import EMOJI_MODEL, EMOJI_SENTIMENT, SentimentBatcher, model_status
+from vitals_aggregates import SUMMARY_WINDOWS, VitalsAggregator
+from vitals_anomaly import VITAL_RULES, VitalsAnomalyDetector
 
 # Load environment variables
 load_dotenv()
@@ -28,21 +40,34 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Supabase setup
 SUPABASE_URL = os.getenv("SUPABASE_URL", "https://your-project.supabase.co")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY", "your-anon-key")
 
-# Initialize Supabase client (will work even with dummy values for testing)
+# Initialize the async Supabase data client (will work even with dummy values for testing)
 try:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    supabase = AsyncDataClient(SUPABASE_URL, SUPABASE_KEY)
     print("✅ Supabase connected successfully!")
 except Exception as e:
     print(f"Warning: Supabase connection failed: {e}")
     print("Please set SUPABASE_URL and SUPABASE_KEY environment variables")
     supabase = None
 
+# Largest number of entries accepted by POST /mood-logs/batch
+MOOD_LOG_BATCH_MAX = int(os.getenv("MOOD_LOG_BATCH_MAX", "500"))
+
+# POST /vitals/stream: rows per bulk insert, longest accepted line, rejections reported back
+VITALS_INGEST_BATCH_SIZE = int(os.getenv("VITALS_INGEST_BATCH_SIZE", "500"))
+VITALS_INGEST_MAX_LINE_BYTES = int(os.getenv("VITALS_INGEST_MAX_LINE_BYTES", "4096"))
+VITALS_INGEST_MAX_ERRORS = int(os.getenv("VITALS_INGEST_MAX_ERRORS", "100"))
+
+# Read-through cache of users rows
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "5000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+
 # Pydantic models
 class UserCreate(BaseModel):
     name: str
@@ -62,6 +87,12 @@ class MedicationCreate(BaseModel):
     dosage: str
     reminder_times: List[str]
 
+class MedicationUpdate(BaseModel):
+    name: Optional[str] = None
+    dosage: Optional[str] = None
+    reminder_times: Optional[List[str]] = None
+    is_active: Optional[bool] = None
+
 class MedicationResponse(BaseModel):
     id: int
     user_id: int
@@ -81,8 +112,15 @@ class MoodLogResponse(BaseModel):
     mood_text: str
     sentiment_score: float
     sentiment_label: str
+    sentiment_model: Optional[str] = None
     created_at: str
 
+class MoodLogBatchEntry(MoodLogCreate):
+    created_at: Optional[datetime] = None  # original time of an offline entry
+
+class MoodLogBatchCreate(BaseModel):
+    entries: List[MoodLogBatchEntry] = Field(..., min_length=1, max_length=MOOD_LOG_BATCH_MAX)
+
 class VitalCreate(BaseModel):
     user_id: int
     blood_pressure_systolic: Optional[int] = None
@@ -90,6 +128,19 @@ class VitalCreate(BaseModel):
     blood_sugar: Optional[float] = None
     sleep_hours: Optional[float] = None
 
+class VitalReading(VitalCreate):
+    created_at: Optional[datetime] = None  # device time of the reading
+
+    @field_validator("created_at")
+    @classmethod
+    def clamp_future_created_at(cls, value: Optional[datetime]) -> Optional[datetime]:
+        """Store device times as naive UTC, never ahead of the server clock"""
+        if value is None:
+            return value
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return min(value, datetime.utcnow())
+
 class VitalResponse(BaseModel):
     id: int
     user_id: int
@@ -104,6 +155,12 @@ class NotificationRequest(BaseModel):
     message: str
     is_urgent: bool = False
 
+class DoseEventCreate(BaseModel):
+    user_id: int
+    medication_id: int
+    scheduled_for: datetime  # the dose's scheduled time, as in reminder_dispatches
+    status: Literal[DOSE_STATUSES]
+
 class QuickMoodLog(BaseModel):
     user_id: int
     mood_emoji: str  # 😃, 😐, 😞
@@ -114,57 +171,238 @@ class InsightResponse(BaseModel):
     medication_insight: Optional[str] = None
     streak_count: int = 0
     streak_type: str = "medication"  # medication, mood
+    computed_at: Optional[datetime] = None  # when the stored insights were last recomputed
+    stale: bool = False  # a refresh triggered by a recent write is still pending
 
-# Lazy-init sentiment analysis pipeline to reduce boot memory on small hosts
-_sentiment_pipeline = None
-
-def get_sentiment_pipeline():
-    global _sentiment_pipeline
-    if _sentiment_pipeline is None:
-        model_name = os.getenv(
-            "SENTIMENT_MODEL",
-            "distilbert-base-uncased-finetuned-sst-2-english",  # lightweight, fast
-        )
-        _sentiment_pipeline = pipeline("sentiment-analysis", model=model_name)
-    return _sentiment_pipeline
+# Sentiment scoring: concurrent mood logs are batched into one forward pass
+sentiment_batcher = SentimentBatcher()
 
-# Email configuration
-SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
-SMTP_USERNAME = os.getenv("SMTP_USERNAME", "")
-SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+# "lazy" loads the model on the first mood log, "background" right after startup
+SENTIMENT_WARMUP = os.getenv("SENTIMENT_WARMUP", "lazy")
 
 def check_database():
     """Check if database is available"""
     if not supabase:
         raise HTTPException(status_code=503, detail="Database not available. Please configure Supabase.")
 
-def send_email(to_email: str, subject: str, body: str):
-    """Send email notification"""
+async def run_query(query, stage: Optional[str] = None, timings: Optional[Dict[str, float]] = None):
+    """Await a Supabase query (or any awaitable), optionally timing it"""
+    started = time.perf_counter()
+    try:
+        return await (query.execute() if hasattr(query, "execute") else query)
+    finally:
+        if timings is not None:
+            timings[stage] = (time.perf_counter() - started) * 1000
+
+async def fetch_page(table: str, user_id: int, response: Response, limit: int, cursor: Optional[str],
+                     since: Optional[datetime], until: Optional[datetime]) -> List[dict]:
+    """One newest-first page of a user's rows; the next cursor goes in a response header"""
     try:
-        msg = MIMEMultipart()
-        msg['From'] = SMTP_USERNAME
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        msg.attach(MIMEText(body, 'plain'))
-        
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_USERNAME, SMTP_PASSWORD)
-        text = msg.as_string()
-        server.sendmail(SMTP_USERNAME, to_email, text)
-        server.quit()
-        return True
+        query = paginate(supabase.table(table).select("*").eq("user_id", user_id), limit, cursor, since, until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result = await query.execute()
+    rows, next_cursor = split_page(result.data or [], limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
+
+# Per-stage latency of GET /dashboard, reported by /metrics
+_dashboard_timings: Dict[str, List[float]] = {}
+
+def record_dashboard_timings(timings: Dict[str, float], response: Response):
+    """Expose stage timings as a Server-Timing header and keep running averages"""
+    response.headers["Server-Timing"] = ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in timings.items())
+    for stage, ms in timings.items():
+        count_and_total = _dashboard_timings.setdefault(stage, [0, 0.0])
+        count_and_total[0] += 1
+        count_and_total[1] += ms
+
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+async def fetch_user(user_id: int) -> Optional[dict]:
+    """Get a users row, served from the cache when possible"""
+    user = user_cache.get(user_id)
+    if user is None:
+        result = await supabase.table("users").select("*").eq("id", user_id).execute()
+        if not result.data:
+            return None
+        user = result.data[0]
+        user_cache.put(user_id, user)
+    return dict(user)
+
+async def fetch_users(user_ids: List[int]) -> List[dict]:
+    """Get several users rows, querying only the ones not cached"""
+    users = {}
+    for user_id in user_ids:
+        user = user_cache.get(user_id)
+        if user is not None:
+            users[user_id] = user
+    missing = [user_id for user_id in user_ids if user_id not in users]
+    if missing:
+        result = await supabase.table("users").select("*").in_("id", missing).execute()
+        for user in result.data or []:
+            user_cache.put(user["id"], user)
+            users[user["id"]] = user
+    return [dict(users[user_id]) for user_id in user_ids if user_id in users]
+
+def invalidate_user(user_id: int):
+    """Drop a cached users row; call after every write to that user"""
+    user_cache.pop(user_id)
+
+# Dose events and precomputed adherence counters
+adherence = AdherenceTracker(supabase) if supabase else None
+
+# Daily vitals buckets behind /vitals/{user_id}/summary
+vitals_aggregator = VitalsAggregator(supabase) if supabase else None
+
+# Latest mood labels per user, kept by a trigger on mood_logs
+mood_state = MoodStateStore(supabase) if supabase else None
+
+# Per-user vitals baselines for anomaly alerts
+anomaly_detector = VitalsAnomalyDetector(supabase) if supabase else None
+
+# Outbound notifications are queued in the outbox and delivered by a background worker
+outbox = NotificationOutbox(supabase) if supabase else None
+_outbox_task = None
+
+async def queue_email(user: dict, subject: str, body: str, alert_type: Optional[str] = None, is_urgent: bool = False):
+    """Queue an email to a user's caregiver"""
+    return await outbox.enqueue(
+        user['caregiver_email'], subject, body,
+        user_id=user['id'], alert_type=alert_type, is_urgent=is_urgent
+    )
+
+async def send_negative_mood_alert(user: dict, mood_texts: List[str]):
+    """Email the caregiver about one or more negative mood entries"""
+    if len(mood_texts) == 1:
+        subject = "HealthMate Alert: Negative Mood Detected"
+        body = f"Your loved one {user['name']} has logged a negative mood. Please check in with them.\n\nMood entry: {mood_texts[0]}"
+    else:
+        subject = "HealthMate Alert: Negative Moods Detected"
+        entries = "\n".join(f"- {text}" for text in mood_texts)
+        body = f"Your loved one {user['name']} has logged {len(mood_texts)} negative moods. Please check in with them.\n\nMood entries:\n{entries}"
+    return await queue_email(user, subject, body, alert_type="negative_mood")
+
+async def send_vital_anomaly_alerts(anomalies: List[dict]):
+    """Email each affected user's caregiver once about their anomalous readings"""
+    by_user: Dict[int, List[dict]] = {}
+    for anomaly in anomalies:
+        by_user.setdefault(anomaly["user_id"], []).append(anomaly)
+    
+    for user in await fetch_users(sorted(by_user)):
+        lines = []
+        for anomaly in by_user[user["id"]]:
+            label, unit = VITAL_RULES[anomaly["metric"]][:2]
+            if anomaly["kind"] == "threshold":
+                side = "below" if anomaly["value"] < anomaly["bound"] else "above"
+                lines.append(f"- {label}: {anomaly['value']} {unit} ({side} the safe limit of {anomaly['bound']} {unit})")
+            else:
+                lines.append(f"- {label}: {anomaly['value']} {unit} (their usual level is about {anomaly['baseline_mean']} {unit})")
+        urgent = any(anomaly["urgent"] for anomaly in by_user[user["id"]])
+        subject = "HealthMate Alert: Unusual Vital Signs" + (" - Please Check Now" if urgent else "")
+        body = f"Your loved one {user['name']} has logged vital signs that need attention.\n\n" + "\n".join(lines)
+        await queue_email(user, subject, body, alert_type="vital_anomaly", is_urgent=urgent)
+
+async def process_stored_vitals(rows: List[dict]) -> List[dict]:
+    """Update aggregates and alert on anomalies after vitals are stored
+
+    Never fails the write: the readings are already saved, and
+    rebuild_vitals_aggregates.py repairs any aggregate drift.
+    """
+    try:
+        await vitals_aggregator.record(rows)
     except Exception as e:
-        print(f"Email sending failed: {e}")
-        return False
+        print(f"Vitals aggregate update error: {e}")
+    
+    try:
+        anomalies = await anomaly_detector.observe(rows)
+        if anomalies:
+            await send_vital_anomaly_alerts(anomalies)
+        return anomalies
+    except Exception as e:
+        print(f"Vitals anomaly check error: {e}")
+        return []
+
+def is_alerting_mood(sentiment_label: str, sentiment_score: float) -> bool:
+    """Whether a scored mood should notify the caregiver"""
+    return sentiment_label == 'negative' and sentiment_score > 0.7
+
+# Startup timing, reported by /ready
+_startup_seconds = None
+
+@app.on_event("startup")
+async def on_startup():
+    global _startup_seconds
+    _startup_seconds = time.perf_counter() - _import_started
+    print(f"🚀 API ready in {_startup_seconds:.2f}s (sentiment warm-up: {SENTIMENT_WARMUP})")
+    if SENTIMENT_WARMUP == "background":
+        asyncio.ensure_future(sentiment_batcher.warm_up())
+    
+    global _outbox_task, _reminder_task, _insights_task
+    if outbox:
+        _outbox_task = asyncio.ensure_future(outbox.run())
+    if reminder_scheduler:
+        _reminder_task = asyncio.ensure_future(reminder_scheduler.run())
+    if insights_store:
+        _insights_task = asyncio.ensure_future(insights_store.run())
+    if anomaly_detector:
+        asyncio.ensure_future(warm_vitals_baselines())
+
+async def warm_vitals_baselines():
+    try:
+        await anomaly_detector.warm()
+    except Exception as e:
+        print(f"Vitals baseline warm-up error: {e}")
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if _outbox_task:
+        _outbox_task.cancel()
+    if _reminder_task:
+        _reminder_task.cancel()
+    if _insights_task:
+        _insights_task.cancel()
+    smtp_pool.close()
+    if supabase:
+        await supabase.aclose()
 
 # API Routes
 @app.get("/")
 async def root():
     return {"message": "HealthMate AI Guardian API is running!"}
 
+@app.get("/ready")
+async def readiness():
+    """Readiness probe: the API is serving; reports whether the model is loaded"""
+    return {
+        "ready": True,
+        "startup_seconds": round(_startup_seconds, 3) if _startup_seconds is not None else None,
+        "sentiment_warmup": SENTIMENT_WARMUP,
+        "sentiment_model": model_status(sentiment_batcher.model_name)
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """Runtime metrics for the background subsystems"""
+    return {
+        "sentiment_batcher": sentiment_batcher.stats(),
+        "sentiment_cache": sentiment_batcher.cache.stats(),
+        "smtp": smtp_pool.stats(),
+        "supabase": supabase.stats() if supabase else None,
+        "user_cache": user_cache.stats(),
+        "outbox": await outbox.stats() if outbox else None,
+        "reminder_scheduler": reminder_scheduler.stats() if reminder_scheduler else None,
+        "adherence": adherence.stats() if adherence else None,
+        "insights": insights_store.stats() if insights_store else None,
+        "mood_state": mood_state.stats() if mood_state else None,
+        "vitals_aggregates": vitals_aggregator.stats() if vitals_aggregator else None,
+        "vitals_anomaly": anomaly_detector.stats() if anomaly_detector else None,
+        "dashboard_avg_ms": {
+            stage: round(total / count, 2) for stage, (count, total) in _dashboard_timings.items()
+        }
+    }
+
 @app.post("/users", response_model=UserResponse)
 async def create_user(user: UserCreate):
     check_database()
@@ -177,9 +415,10 @@ async def create_user(user: UserCreate):
             "created_at": datetime.utcnow().isoformat()
         }
         
-        result = supabase.table("users").insert(user_data).execute()
+        result = await supabase.table("users").insert(user_data).execute()
         
         if result.data:
+            invalidate_user(result.data[0]["id"])
             return result.data[0]
         else:
             raise HTTPException(status_code=400, detail="Failed to create user")
@@ -191,12 +430,14 @@ async def get_user(user_id: int):
     check_database()
     
     try:
-        result = supabase.table("users").select("*").eq("id", user_id).execute()
+        user = await fetch_user(user_id)
         
-        if result.data:
-            return result.data[0]
+        if user:
+            return user
         else:
             raise HTTPException(status_code=404, detail="User not found")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
@@ -214,9 +455,11 @@ async def create_medication(medication: MedicationCreate):
             "created_at": datetime.utcnow().isoformat()
         }
         
-        result = supabase.table("medications").insert(medication_data).execute()
+        result = await supabase.table("medications").insert(medication_data).execute()
         
         if result.data:
+            reminder_scheduler.upsert(result.data[0])
+            await insights_store.mark_dirty(medication.user_id)
             # Convert reminder_times back to list for response
             result.data[0]["reminder_times"] = json.loads(result.data[0]["reminder_times"])
             return result.data[0]
@@ -225,20 +468,52 @@ async def create_medication(medication: MedicationCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@app.patch("/medications/{medication_id}", response_model=MedicationResponse)
+async def update_medication(medication_id: int, update: MedicationUpdate):
+    """Change a medication or deactivate it (is_active=false); reminders follow immediately"""
+    check_database()
+    
+    try:
+        changes = update.model_dump(exclude_none=True)
+        if "reminder_times" in changes:
+            changes["reminder_times"] = json.dumps(changes["reminder_times"])
+        if not changes:
+            raise HTTPException(status_code=400, detail="Nothing to update")
+        
+        result = await supabase.table("medications").update(changes).eq("id", medication_id).execute()
+        if not result.data:
+            raise HTTPException(status_code=404, detail="Medication not found")
+        
+        medication = result.data[0]
+        reminder_scheduler.upsert(medication)
+        await insights_store.mark_dirty(medication["user_id"])
+        medication["reminder_times"] = json.loads(medication["reminder_times"])
+        return medication
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
 @app.get("/medications/{user_id}", response_model=List[MedicationResponse])
-async def get_user_medications(user_id: int):
+async def get_user_medications(
+    user_id: int,
+    response: Response,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
     check_database()
     
     try:
-        result = supabase.table("medications").select("*").eq("user_id", user_id).execute()
+        medications = await fetch_page("medications", user_id, response, limit, cursor, since, until)
         
-        if result.data:
-            # Convert reminder_times back to list for each medication
-            for med in result.data:
-                med["reminder_times"] = json.loads(med["reminder_times"])
-            return result.data
-        else:
-            return []
+        # Convert reminder_times back to list for each medication
+        for med in medications:
+            med["reminder_times"] = json.loads(med["reminder_times"])
+        return medications
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
@@ -247,38 +522,30 @@ async def create_mood_log(mood_log: MoodLogCreate):
     check_database()
     
     try:
-        # Analyze sentiment (lazy model load)
-        result = get_sentiment_pipeline()(mood_log.mood_text)
-        sentiment_score = result[0]['score']
-        sentiment_label = result[0]['label']
-        
-        # Map sentiment labels to more user-friendly terms
-        label_mapping = {
-            'LABEL_0': 'negative',
-            'LABEL_1': 'neutral', 
-            'LABEL_2': 'positive'
-        }
-        sentiment_label = label_mapping.get(sentiment_label, sentiment_label)
+        # Analyze sentiment (lazy model load, batched with concurrent requests)
+        result = await sentiment_batcher.score(mood_log.mood_text)
+        sentiment_score = result['score']
+        sentiment_label = result['label']
         
         mood_data = {
             "user_id": mood_log.user_id,
             "mood_text": mood_log.mood_text,
             "sentiment_score": sentiment_score,
             "sentiment_label": sentiment_label,
+            "sentiment_model": result['model'],
             "created_at": datetime.utcnow().isoformat()
         }
         
-        result = supabase.table("mood_logs").insert(mood_data).execute()
+        result = await supabase.table("mood_logs").insert(mood_data).execute()
         
         if result.data:
+            await insights_store.mark_dirty(mood_log.user_id)
+            
             # Check if we should send notification to caregiver
-            if sentiment_label == 'negative' and sentiment_score > 0.7:
-                user_result = supabase.table("users").select("*").eq("id", mood_log.user_id).execute()
-                if user_result.data:
-                    user = user_result.data[0]
-                    subject = "HealthMate Alert: Negative Mood Detected"
-                    body = f"Your loved one {user['name']} has logged a negative mood. Please check in with them.\n\nMood entry: {mood_log.mood_text}"
-                    send_email(user['caregiver_email'], subject, body)
+            if is_alerting_mood(sentiment_label, sentiment_score):
+                user = await fetch_user(mood_log.user_id)
+                if user:
+                    await send_negative_mood_alert(user, [mood_log.mood_text])
             
             return result.data[0]
         else:
@@ -286,6 +553,69 @@ async def create_mood_log(mood_log: MoodLogCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@app.get("/mood-logs/{user_id}", response_model=List[MoodLogResponse])
+async def get_user_mood_logs(
+    user_id: int,
+    response: Response,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """Mood history, newest first"""
+    check_database()
+    
+    try:
+        return await fetch_page("mood_logs", user_id, response, limit, cursor, since, until)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@app.post("/mood-logs/batch", response_model=List[MoodLogResponse])
+async def create_mood_logs_batch(batch: MoodLogBatchCreate):
+    """Ingest many mood logs at once (e.g. an offline sync from the companion app)"""
+    check_database()
+    
+    try:
+        # Score all entries in model-sized batches
+        results = await sentiment_batcher.score_many([entry.mood_text for entry in batch.entries])
+        
+        now = datetime.utcnow().isoformat()
+        mood_rows = [
+            {
+                "user_id": entry.user_id,
+                "mood_text": entry.mood_text,
+                "sentiment_score": result['score'],
+                "sentiment_label": result['label'],
+                "sentiment_model": result['model'],
+                "created_at": entry.created_at.isoformat() if entry.created_at else now
+            }
+            for entry, result in zip(batch.entries, results)
+        ]
+        
+        # One insert round trip for the whole batch
+        result = await supabase.table("mood_logs").insert(mood_rows).execute()
+        if not result.data:
+            raise HTTPException(status_code=400, detail="Failed to create mood logs")
+        await insights_store.mark_dirty(*{row["user_id"] for row in mood_rows})
+        
+        # Evaluate caregiver alerts once per user
+        alerting_texts = {}
+        for row in mood_rows:
+            if is_alerting_mood(row["sentiment_label"], row["sentiment_score"]):
+                alerting_texts.setdefault(row["user_id"], []).append(row["mood_text"])
+        
+        if alerting_texts:
+            for user in await fetch_users(list(alerting_texts)):
+                await send_negative_mood_alert(user, alerting_texts[user["id"]])
+        
+        return result.data
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
 @app.post("/vitals", response_model=VitalResponse)
 async def create_vital(vital: VitalCreate):
     check_database()
@@ -300,26 +630,135 @@ async def create_vital(vital: VitalCreate):
             "created_at": datetime.utcnow().isoformat()
         }
         
-        result = supabase.table("vitals").insert(vital_data).execute()
+        result = await supabase.table("vitals").insert(vital_data).execute()
         
         if result.data:
+            await process_stored_vitals(result.data)
             return result.data[0]
         else:
             raise HTTPException(status_code=400, detail="Failed to create vital")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+async def ndjson_lines(request: Request):
+    """Yield (line number, line bytes or None if too long) from a streamed body
+
+    Each chunk is scanned once from a read offset and the consumed prefix is
+    dropped once per chunk, so many short lines cost linear time.
+    """
+    buffer = bytearray()
+    line_number = 0
+    oversized = False
+    async for chunk in request.stream():
+        buffer += chunk
+        start = 0
+        while True:
+            newline = buffer.find(b"\n", start)
+            if newline < 0:
+                break
+            line = bytes(buffer[start:newline])
+            start = newline + 1
+            line_number += 1
+            yield line_number, None if oversized or len(line) > VITALS_INGEST_MAX_LINE_BYTES else line
+            oversized = False
+        del buffer[:start]
+        if len(buffer) > VITALS_INGEST_MAX_LINE_BYTES:
+            # Drop the rest of an over-long line instead of buffering it
+            buffer.clear()
+            oversized = True
+    if buffer or oversized:
+        yield line_number + 1, None if oversized else bytes(buffer)
+
+@app.post("/vitals/stream")
+async def ingest_vitals_stream(request: Request):
+    """Ingest newline-delimited JSON vitals from connected devices
+    
+    Each line is a VitalCreate object, optionally with the reading's
+    created_at. Lines are validated as they arrive and written in bulk
+    inserts of VITALS_INGEST_BATCH_SIZE, so memory stays flat for any upload
+    size. Rejected lines are reported by line number, and readings flagged
+    by the anomaly detector are counted.
+    """
+    check_database()
+    
+    accepted = 0
+    rejected = 0
+    anomalies = 0
+    errors = []
+    batch = []  # (line number, row)
+    
+    def reject(line_number: int, error: str):
+        nonlocal rejected
+        rejected += 1
+        if len(errors) < VITALS_INGEST_MAX_ERRORS:
+            errors.append({"line": line_number, "error": error})
+    
+    async def flush():
+        nonlocal accepted, anomalies
+        try:
+            result = await supabase.table("vitals").insert([row for _, row in batch]).execute()
+            accepted += len(batch)
+        except Exception as e:
+            for line_number, _ in batch:
+                reject(line_number, f"Database error: {str(e)}")
+        else:
+            anomalies += len(await process_stored_vitals(result.data or [row for _, row in batch]))
+        batch.clear()
+    
+    async for line_number, line in ndjson_lines(request):
+        if line is None:
+            reject(line_number, f"Line longer than {VITALS_INGEST_MAX_LINE_BYTES} bytes")
+            continue
+        if not line.strip():
+            continue
+        try:
+            reading = VitalReading.model_validate_json(line)
+        except ValidationError as e:
+            reject(line_number, "; ".join(error["msg"] for error in e.errors()))
+            continue
+        
+        row = reading.model_dump(exclude={"created_at"})
+        row["created_at"] = (reading.created_at or datetime.utcnow()).isoformat()
+        batch.append((line_number, row))
+        if len(batch) >= VITALS_INGEST_BATCH_SIZE:
+            await flush()
+    
+    if batch:
+        await flush()
+    
+    return {
+        "accepted": accepted,
+        "rejected": rejected,
+        "anomalies": anomalies,
+        "errors": errors,
+        "errors_truncated": rejected > len(errors)
+    }
+
 @app.get("/vitals/{user_id}", response_model=List[VitalResponse])
-async def get_user_vitals(user_id: int):
+async def get_user_vitals(
+    user_id: int,
+    response: Response,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
     check_database()
     
     try:
-        result = supabase.table("vitals").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
-        
-        if result.data:
-            return result.data
-        else:
-            return []
+        return await fetch_page("vitals", user_id, response, limit, cursor, since, until)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@app.get("/vitals/{user_id}/summary")
+async def get_vitals_summary(user_id: int):
+    """Rolling 7/30/90-day count, mean, min, max and daily trend of each vital"""
+    check_database()
+    
+    try:
+        return {"user_id": user_id, "windows": await vitals_aggregator.summary(user_id, SUMMARY_WINDOWS)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
@@ -328,35 +767,82 @@ async def send_notification(notification: NotificationRequest):
     check_database()
     
     try:
-        user_result = supabase.table("users").select("*").eq("id", notification.user_id).execute()
+        user = await fetch_user(notification.user_id)
         
-        if not user_result.data:
+        if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        user = user_result.data[0]
         subject = "HealthMate Alert" if not notification.is_urgent else "URGENT: HealthMate Alert"
-        success = send_email(user['caregiver_email'], subject, notification.message)
+        queued = await queue_email(user, subject, notification.message, is_urgent=notification.is_urgent)
         
-        return {"success": success, "message": "Notification sent" if success else "Failed to send notification"}
+        return {"success": True, "message": "Notification queued", "notification_id": queued.get("id")}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
+@app.get("/export/{user_id}")
+async def export_user_history(
+    user_id: int,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    tables: str = ",".join(EXPORT_COLUMNS),
+):
+    """Stream a user's complete history as NDJSON (any tables) or CSV (one table)"""
+    check_database()
+    
+    selected = [table.strip() for table in tables.split(",") if table.strip()]
+    unknown = [table for table in selected if table not in EXPORT_COLUMNS]
+    if not selected or unknown:
+        raise HTTPException(status_code=400, detail=f"tables must be a subset of {', '.join(EXPORT_COLUMNS)}")
+    if format == "csv" and len(selected) != 1:
+        raise HTTPException(status_code=400, detail="CSV export takes exactly one table")
+    
+    try:
+        user = await fetch_user(user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    stamp = datetime.utcnow().strftime("%Y%m%d")
+    if format == "csv":
+        body = csv_export(supabase, user_id, selected[0])
+        media_type = "text/csv"
+        filename = f"healthmate_user{user_id}_{selected[0]}_{stamp}.csv"
+    else:
+        body = ndjson_export(supabase, user_id, selected)
+        media_type = "application/x-ndjson"
+        filename = f"healthmate_user{user_id}_{stamp}.ndjson"
+    
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @app.get("/dashboard/{user_id}")
-async def get_dashboard_data(user_id: int):
+async def get_dashboard_data(user_id: int, response: Response):
     """Get comprehensive dashboard data for a user"""
     check_database()
     
     try:
-        # Get user
-        user_result = supabase.table("users").select("*").eq("id", user_id).execute()
-        if not user_result.data:
-            raise HTTPException(status_code=404, detail="User not found")
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
         
-        user = user_result.data[0]
+        # Independent reads are issued concurrently
+        user, medications_result, mood_result, vitals_result, insights = await asyncio.gather(
+            run_query(fetch_user(user_id), "user", timings),
+            run_query(supabase.table("medications").select("*").eq("user_id", user_id).eq("is_active", True), "medications", timings),
+            run_query(supabase.table("mood_logs").select("*").eq("user_id", user_id).order("created_at", desc=True).limit(1), "recent_mood", timings),
+            run_query(supabase.table("vitals").select("*").eq("user_id", user_id).order("created_at", desc=True).limit(5), "recent_vitals", timings),
+            run_query(insights_store.get(user_id), "insights", timings),
+        )
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
         
-        # Get medications
-        medications_result = supabase.table("medications").select("*").eq("user_id", user_id).eq("is_active", True).execute()
         medications = medications_result.data or []
+        recent_mood = mood_result.data[0] if mood_result.data else None
+        recent_vitals = vitals_result.data or []
         
         # Convert reminder_times safely for each medication
         for med in medications:
@@ -371,24 +857,18 @@ async def get_dashboard_data(user_id: int):
             except Exception:
                 med["reminder_times"] = []
         
-        # Get recent mood
-        mood_result = supabase.table("mood_logs").select("*").eq("user_id", user_id).order("created_at", desc=True).limit(1).execute()
-        recent_mood = mood_result.data[0] if mood_result.data else None
-        
-        # Get recent vitals
-        vitals_result = supabase.table("vitals").select("*").eq("user_id", user_id).order("created_at", desc=True).limit(5).execute()
-        recent_vitals = vitals_result.data or []
-        
-        # Get insights
-        insights = await get_user_insights(user_id)
+        timings["total"] = (time.perf_counter() - started) * 1000
+        record_dashboard_timings(timings, response)
         
         return {
             "user": user,
             "medications": medications,
             "recent_mood": recent_mood,
             "recent_vitals": recent_vitals,
-            "insights": insights
+            "insights": InsightResponse.model_validate(insights)
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
@@ -399,16 +879,10 @@ async def create_quick_mood_log(quick_mood: QuickMoodLog):
     
     try:
         # Map emoji to sentiment
-        emoji_mapping = {
-            "😃": {"label": "positive", "score": 0.9},
-            "😐": {"label": "neutral", "score": 0.5},
-            "😞": {"label": "negative", "score": 0.1}
-        }
-        
-        if quick_mood.mood_emoji not in emoji_mapping:
+        if quick_mood.mood_emoji not in EMOJI_SENTIMENT:
             raise HTTPException(status_code=400, detail="Invalid emoji")
         
-        sentiment_data = emoji_mapping[quick_mood.mood_emoji]
+        sentiment_data = EMOJI_SENTIMENT[quick_mood.mood_emoji]
         mood_text = quick_mood.mood_text or f"Quick mood: {quick_mood.mood_emoji}"
         
         mood_data = {
@@ -416,12 +890,15 @@ async def create_quick_mood_log(quick_mood: QuickMoodLog):
             "mood_text": mood_text,
             "sentiment_score": sentiment_data["score"],
             "sentiment_label": sentiment_data["label"],
+            "sentiment_model": EMOJI_MODEL,
             "created_at": datetime.utcnow().isoformat()
         }
         
-        result = supabase.table("mood_logs").insert(mood_data).execute()
+        result = await supabase.table("mood_logs").insert(mood_data).execute()
         
         if result.data:
+            await insights_store.mark_dirty(quick_mood.user_id)
+            
             # Check for consecutive negative moods
             await check_consecutive_negative_moods(quick_mood.user_id)
             return result.data[0]
@@ -430,41 +907,84 @@ async def create_quick_mood_log(quick_mood: QuickMoodLog):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+def compute_user_insights(mood_labels: List[str], medications: List[dict], adherence_summary: dict) -> InsightResponse:
+    """Build insights from the last 7 days of sentiment labels (newest first), active medications and adherence counters"""
+    insights = InsightResponse()
+    
+    # Mood insights
+    if len(mood_labels) >= 3:
+        recent_moods = mood_labels[:3]
+        if all(mood == "negative" for mood in recent_moods):
+            insights.mood_insight = "You've had 3 negative moods in a row → consider resting more. 💙"
+        elif all(mood == "positive" for mood in recent_moods):
+            insights.mood_insight = "Amazing! 3 positive moods in a row! Keep it up! 🌟"
+    
+    # Medication insights
+    this_week = adherence_summary["this_week"]
+    all_time = adherence_summary["all_time"]
+    if this_week["doses_total"]:
+        insights.medication_insight = f"You've taken {this_week['on_time_rate']:g}% of your meds on time this week 👏"
+    elif all_time["doses_total"]:
+        insights.medication_insight = f"You've taken {all_time['on_time_rate']:g}% of your meds on time so far 👏"
+    elif medications:
+        insights.medication_insight = "Mark your doses as taken to start tracking your streak 💊"
+    
+    # Consecutive doses taken on time
+    insights.streak_count = all_time["current_streak"]
+    insights.streak_type = "medication"
+    
+    return insights
+
+@app.post("/doses")
+async def record_dose(dose: DoseEventCreate):
+    """Mark a scheduled dose as taken, late or skipped (re-marking corrects it)"""
+    check_database()
+    
+    try:
+        medication = await supabase.table("medications").select("id,user_id").eq("id", dose.medication_id).execute()
+        if not medication.data or medication.data[0]["user_id"] != dose.user_id:
+            raise HTTPException(status_code=404, detail="Medication not found")
+        
+        event = await adherence.record(dose.user_id, dose.medication_id, dose.scheduled_for, dose.status)
+        await insights_store.mark_dirty(dose.user_id)
+        return {"event": event, "adherence": await adherence.summary(dose.user_id)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@app.get("/adherence/{user_id}")
+async def get_adherence(user_id: int):
+    """Precomputed adherence rates and streaks (all-time and this week)"""
+    check_database()
+    
+    try:
+        return await adherence.summary(user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+async def compute_insights_row(user_id: int) -> dict:
+    """Fresh insights for one user, as stored in user_insights"""
+    mood_history, med_result, adherence_summary = await asyncio.gather(
+        mood_state.history(user_id),
+        run_query(supabase.table("medications").select("*").eq("user_id", user_id).eq("is_active", True)),
+        adherence.summary(user_id),
+    )
+    mood_labels = mood_history.labels(since=datetime.utcnow() - timedelta(days=7))
+    insights = compute_user_insights(mood_labels, med_result.data or [], adherence_summary)
+    return insights.model_dump(exclude={"computed_at", "stale"})
+
+# Materialized insights, recomputed after mood, medication and dose writes (started with the app)
+insights_store = InsightsMaterializer(supabase, compute_insights_row) if supabase else None
+_insights_task = None
+
 @app.get("/insights/{user_id}", response_model=InsightResponse)
-async def get_user_insights(user_id: int):
-    """Get smart insights for the user"""
+async def get_user_insights(user_id: int, refresh: bool = False):
+    """Get smart insights for the user (stored; refresh=true recomputes them first)"""
     check_database()
     
     try:
-        # Get mood logs from last 7 days
-        seven_days_ago = (datetime.utcnow() - timedelta(days=7)).isoformat()
-        mood_result = supabase.table("mood_logs").select("*").eq("user_id", user_id).gte("created_at", seven_days_ago).order("created_at", desc=True).execute()
-        mood_logs = mood_result.data or []
-        
-        # Get medication logs (simplified - in real app, you'd track actual medication taking)
-        med_result = supabase.table("medications").select("*").eq("user_id", user_id).eq("is_active", True).execute()
-        medications = med_result.data or []
-        
-        insights = InsightResponse()
-        
-        # Mood insights
-        if len(mood_logs) >= 3:
-            recent_moods = [log["sentiment_label"] for log in mood_logs[:3]]
-            if all(mood == "negative" for mood in recent_moods):
-                insights.mood_insight = "You've had 3 negative moods in a row → consider resting more. 💙"
-            elif all(mood == "positive" for mood in recent_moods):
-                insights.mood_insight = "Amazing! 3 positive moods in a row! Keep it up! 🌟"
-        
-        # Medication insights
-        if medications:
-            adherence_rate = 90  # Simplified - in real app, calculate from actual logs
-            insights.medication_insight = f"You've taken {adherence_rate}% of your meds on time this week 👏"
-        
-        # Streak calculation (simplified)
-        insights.streak_count = 5  # Simplified - in real app, calculate from actual data
-        insights.streak_type = "medication"
-        
-        return insights
+        return await insights_store.get(user_id, refresh=refresh)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
@@ -475,34 +995,36 @@ async def get_adaptive_reminders(user_id: int):
     
     try:
         # Get user
-        user_result = supabase.table("users").select("*").eq("id", user_id).execute()
-        if not user_result.data:
+        user = await fetch_user(user_id)
+        if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        user = user_result.data[0]
-        
-        # Get medications
-        medications_result = supabase.table("medications").select("*").eq("user_id", user_id).eq("is_active", True).execute()
-        medications = medications_result.data or []
+        # Get medications, already parsed by the scheduler once it has loaded
+        if reminder_scheduler and reminder_scheduler.loaded:
+            medications = [(schedule.name, schedule.times) for schedule in reminder_scheduler.user_schedules(user_id)]
+        else:
+            medications_result = await supabase.table("medications").select("*").eq("user_id", user_id).eq("is_active", True).execute()
+            medications = [(med["name"], json.loads(med["reminder_times"])) for med in medications_result.data or []]
         
         # Get recent mood
-        mood_result = supabase.table("mood_logs").select("*").eq("user_id", user_id).order("created_at", desc=True).limit(1).execute()
+        mood_result = await supabase.table("mood_logs").select("*").eq("user_id", user_id).order("created_at", desc=True).limit(1).execute()
         recent_mood = mood_result.data[0] if mood_result.data else None
         
         # Generate adaptive reminders
         reminders = []
-        for med in medications:
-            reminder_times = json.loads(med["reminder_times"])
+        for medication_name, reminder_times in medications:
             for time in reminder_times:
-                reminder = generate_adaptive_reminder(user["name"], med["name"], recent_mood)
+                reminder = generate_adaptive_reminder(user["name"], medication_name, recent_mood)
                 reminders.append({
-                    "medication": med["name"],
+                    "medication": medication_name,
                     "time": time,
                     "reminder": reminder,
                     "mood_based": recent_mood is not None
                 })
         
         return {"reminders": reminders}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
@@ -520,23 +1042,32 @@ def generate_adaptive_reminder(name: str, medicine: str, recent_mood: dict = Non
     else:
         return f"Time for your {medicine}, {name}. Take care! 💊"
 
+# Fires medication reminders at their scheduled times (started with the app)
+async def notify_caregiver_of_reminder(user: dict, medication_name: str, message: str):
+    """Tell the caregiver a reminder went out (REMINDER_NOTIFY_CAREGIVER); not urgent, so it can be digested"""
+    subject = f"HealthMate: {user['name']} was reminded to take {medication_name}"
+    body = f"Your loved one {user['name']} was sent this medication reminder:\n\n{message}"
+    await queue_email(user, subject, body, alert_type="medication_reminder")
+
+reminder_scheduler = ReminderScheduler(
+    supabase, fetch_users, generate_adaptive_reminder,
+    notifier=notify_caregiver_of_reminder if REMINDER_NOTIFY_CAREGIVER else None,
+) if supabase else None
+_reminder_task = None
+
 async def check_consecutive_negative_moods(user_id: int):
     """Check for consecutive negative moods and send caregiver alert"""
     try:
-        # Get last 2 mood logs
-        mood_result = supabase.table("mood_logs").select("*").eq("user_id", user_id).order("created_at", desc=True).limit(2).execute()
-        mood_logs = mood_result.data or []
-        
-        if len(mood_logs) >= 2:
-            recent_moods = [log["sentiment_label"] for log in mood_logs[:2]]
-            if all(mood == "negative" for mood in recent_moods):
-                # Send caregiver notification
-                user_result = supabase.table("users").select("*").eq("id", user_id).execute()
-                if user_result.data:
-                    user = user_result.data[0]
-                    subject = "HealthMate Alert: Consecutive Negative Moods"
-                    body = f"Your loved one {user['name']} has logged 2 consecutive negative moods. Please check in with them."
-                    send_email(user['caregiver_email'], subject, body)
+        # Latest moods from the shared mood_state row, current as of the log just written
+        mood_history = await mood_state.history(user_id)
+        
+        if mood_history.streak("negative", 2):
+            # Send caregiver notification
+            user = await fetch_user(user_id)
+            if user:
+                subject = "HealthMate Alert: Consecutive Negative Moods"
+                body = f"Your loved one {user['name']} has logged 2 consecutive negative moods. Please check in with them."
+                await queue_email(user, subject, body, alert_type="consecutive_negative_moods")
     except Exception as e:
         print(f"Error checking consecutive moods: {e}")
 
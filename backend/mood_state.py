@@ -0,0 +1,59 @@
+"""
+HealthMate AI Guardian - Mood state
+Each user's latest sentiment labels, kept in the mood_state table by a trigger
+on mood_logs. The row changes in the same transaction as every mood log write,
+re-scoring included, so every API worker sees the same streaks. Consecutive-
+mood alerts and insight rules read that one primary-key row instead of
+querying mood_logs.
+"""
+
+from datetime import datetime
+from typing import List, Optional
+
+from notifications import parse_timestamp
+
+MOOD_STATE_SIZE = 8  # latest labels kept per user, set by refresh_mood_state() in the schema
+
+class MoodHistory:
+    """One user's latest mood labels, newest first"""
+
+    __slots__ = ("entries",)
+
+    def __init__(self, row: Optional[dict] = None):
+        row = row or {}
+        self.entries = list(zip(
+            (parse_timestamp(value) for value in row.get("recent_logged_at") or []),
+            row.get("recent_labels") or [],
+        ))
+
+    def labels(self, since: Optional[datetime] = None) -> List[str]:
+        """Sentiment labels, newest first, optionally only those logged since a time"""
+        return [label for logged_at, label in self.entries if since is None or logged_at >= since]
+
+    def streak(self, label: str, count: int) -> bool:
+        """Whether the latest ``count`` moods all have this label"""
+        latest = self.labels()[:count]
+        return len(latest) == count and all(value == label for value in latest)
+
+class MoodStateStore:
+    """Reads users' mood_state rows; the database trigger does all the writing"""
+
+    def __init__(self, supabase):  # async data client (see data_client.py)
+        self.supabase = supabase
+
+        # Metrics
+        self.reads = 0
+
+    async def history(self, user_id: int) -> MoodHistory:
+        """A user's latest moods; empty when they have never logged one"""
+        self.reads += 1
+        rows = (
+            await self.supabase.table("mood_state")
+            .select("recent_labels,recent_logged_at")
+            .eq("user_id", user_id)
+            .execute()
+        ).data
+        return MoodHistory(rows[0] if rows else None)
+
+    def stats(self) -> dict:
+        return {"size_per_user": MOOD_STATE_SIZE, "reads": self.reads}
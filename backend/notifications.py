@@ -0,0 +1,506 @@
+"""
+HealthMate AI Guardian - Notifications
+Caregiver email delivery over pooled, persistent SMTP connections, fed by a
+durable outbox table and a background delivery worker
+"""
+
+import asyncio
+import os
+import queue
+import random
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+from postgrest.exceptions import APIError
+
+# Load environment variables
+load_dotenv()
+
+# Email configuration
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME", "")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "240"))  # most servers drop idle sessions after ~5 min
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))
+
+# Outbox configuration
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "30"))  # seconds, doubled per attempt
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "3600"))
+OUTBOX_LEASE_SECONDS = 300  # a claimed row is retried if its worker dies mid-send
+
+OUTBOX_ENQUEUE_RETRIES = 5
+UNIQUE_VIOLATION = "23505"  # Postgres error code
+
+# Alert coalescing (opt-in): duplicate (user, alert type) alerts inside the
+# window are dropped, and non-urgent alerts are held for the window so
+# everything pending for one caregiver goes out as a single digest. 0 (the
+# default) sends every alert as soon as it is queued.
+ALERT_DIGEST_WINDOW = float(os.getenv("ALERT_DIGEST_WINDOW", "0"))
+ALERT_DIGEST_MAX_ITEMS = 50
+
+class SMTPConnectionPool:
+    """Keeps authenticated SMTP sessions alive and reuses them across sends
+
+    At most ``size`` sessions exist at once. Sessions idle for longer than
+    ``idle_timeout`` are closed instead of reused, and a send that hits a
+    dropped connection reconnects and retries once.
+    """
+
+    def __init__(
+        self,
+        server: str = SMTP_SERVER,
+        port: int = SMTP_PORT,
+        username: str = SMTP_USERNAME,
+        password: str = SMTP_PASSWORD,
+        size: int = SMTP_POOL_SIZE,
+        idle_timeout: float = SMTP_IDLE_TIMEOUT,
+        timeout: float = SMTP_TIMEOUT,
+    ):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = max(1, size)
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[Tuple[smtplib.SMTP, float]]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+
+        # Metrics
+        self.sends = 0
+        self.failures = 0
+        self.connections_opened = 0
+        self.reconnects = 0
+        self.total_send_ms = 0.0
+        self.max_send_ms = 0.0
+        self.last_send_ms: Optional[float] = None
+
+    def _connect(self) -> smtplib.SMTP:
+        connection = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password)
+        self.connections_opened += 1
+        return connection
+
+    def _acquire(self) -> smtplib.SMTP:
+        while True:
+            try:
+                connection, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - last_used < self.idle_timeout:
+                return connection
+            self._discard(connection)
+
+    def _release(self, connection: smtplib.SMTP):
+        self._idle.put((connection, time.monotonic()))
+
+    @staticmethod
+    def _discard(connection: smtplib.SMTP):
+        try:
+            connection.quit()
+        except Exception:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def send(self, from_addr: str, to_addr: str, message: str):
+        """Send one message, reconnecting once if the session was dropped"""
+        started = time.perf_counter()
+        with self._slots:
+            try:
+                for attempt in range(2):
+                    connection = self._acquire()
+                    try:
+                        connection.sendmail(from_addr, to_addr, message)
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError):
+                        # The server answered; the session itself is still usable
+                        self._release(connection)
+                        raise
+                    except (smtplib.SMTPServerDisconnected, OSError):
+                        self._discard(connection)
+                        if attempt == 1:
+                            raise
+                        self.reconnects += 1
+                        continue
+                    except smtplib.SMTPException:
+                        # Any other protocol error leaves the session in an unknown state
+                        self._discard(connection)
+                        raise
+                    self._release(connection)
+                    break
+            except Exception:
+                self.failures += 1
+                raise
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.sends += 1
+        self.total_send_ms += elapsed_ms
+        self.max_send_ms = max(self.max_send_ms, elapsed_ms)
+        self.last_send_ms = elapsed_ms
+
+    def close(self):
+        """Close every idle session"""
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(connection)
+
+    def stats(self) -> dict:
+        return {
+            "server": f"{self.server}:{self.port}",
+            "pool_size": self.size,
+            "idle_connections": self._idle.qsize(),
+            "connections_opened": self.connections_opened,
+            "reconnects": self.reconnects,
+            "sends": self.sends,
+            "failures": self.failures,
+            "avg_send_ms": round(self.total_send_ms / self.sends, 2) if self.sends else 0.0,
+            "max_send_ms": round(self.max_send_ms, 2),
+            "last_send_ms": round(self.last_send_ms, 2) if self.last_send_ms is not None else None,
+        }
+
+smtp_pool = SMTPConnectionPool()
+
+def build_message(to_email: str, subject: str, body: str) -> str:
+    msg = MIMEMultipart()
+    msg['From'] = SMTP_USERNAME
+    msg['To'] = to_email
+    msg['Subject'] = subject
+
+    msg.attach(MIMEText(body, 'plain'))
+    return msg.as_string()
+
+def send_email(to_email: str, subject: str, body: str):
+    """Send email notification"""
+    try:
+        smtp_pool.send(SMTP_USERNAME, to_email, build_message(to_email, subject, body))
+        return True
+    except Exception as e:
+        print(f"Email sending failed: {e}")
+        return False
+
+async def send_email_async(to_email: str, subject: str, body: str) -> bool:
+    """send_email on a worker thread, so async handlers never block the event loop on SMTP"""
+    return await asyncio.to_thread(send_email, to_email, subject, body)
+
+def parse_timestamp(value: str) -> datetime:
+    """Parse a PostgREST timestamp into a naive UTC datetime"""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.replace(tzinfo=None) - (parsed.utcoffset() or timedelta())
+    return parsed
+
+class NotificationOutbox:
+    """Durable queue of outbound emails backed by the notification_outbox table
+
+    Handlers call ``enqueue`` and return as soon as the row is committed; the
+    ``run`` loop claims due rows, sends them over the SMTP pool and retries
+    failures with exponential backoff. Rows are claimed with a compare-and-set
+    on ``attempts``, so several API workers can share one outbox.
+
+    Non-urgent alerts wait out ``digest_window`` and are then merged with
+    every other pending non-urgent alert for the same caregiver into one
+    digest email. Urgent alerts skip the window and are sent on their own.
+    """
+
+    def __init__(
+        self,
+        supabase,  # async data client (see data_client.py)
+        poll_interval: float = OUTBOX_POLL_INTERVAL,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        digest_window: float = ALERT_DIGEST_WINDOW,
+    ):
+        self.supabase = supabase
+        self.digest_window = digest_window
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._wake: Optional[asyncio.Event] = None
+
+        # Metrics
+        self.enqueued = 0
+        self.deduplicated = 0
+        self.digests = 0
+        self.digest_items = 0
+        self.delivered = 0
+        self.retried = 0
+        self.dead = 0
+        self.total_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+
+    async def enqueue(self, to_email: str, subject: str, body: str, user_id: Optional[int] = None,
+                alert_type: Optional[str] = None, is_urgent: bool = False) -> dict:
+        """Write a notification to the outbox and wake the worker
+
+        A non-urgent alert that repeats a (user, alert type) still held or
+        already sent inside the digest window is not queued again; the held
+        row's ``occurrences`` count is bumped instead. A repeat arriving while
+        the earlier alert is being sent gets its own row. The unique
+        ``dedupe_key`` index makes concurrent repeats fold into one held row.
+        """
+        dedupe_key = None
+        if alert_type and user_id is not None and not is_urgent and self.digest_window > 0:
+            dedupe_key = f"{user_id}:{alert_type}"
+
+        for _ in range(OUTBOX_ENQUEUE_RETRIES):
+            now = datetime.utcnow()
+            if dedupe_key:
+                window_start = now - timedelta(seconds=self.digest_window)
+                existing = (
+                    await self.supabase.table("notification_outbox")
+                    .select("*")
+                    .eq("user_id", user_id)
+                    .eq("alert_type", alert_type)
+                    .eq("is_urgent", False)
+                    .neq("status", "failed")
+                    .gte("created_at", window_start.isoformat())
+                    .order("created_at", desc=True)
+                    .limit(1)
+                    .execute()
+                ).data
+                if existing:
+                    row = existing[0]
+                    if row["status"] == "sent" or (row["status"] == "pending" and await self._bump(row)):
+                        self.deduplicated += 1
+                        return dict(row, deduplicated=True)
+                    # Otherwise the earlier alert is already going out; queue this one
+
+            send_at = now if is_urgent else now + timedelta(seconds=self.digest_window)
+            try:
+                result = await self.supabase.table("notification_outbox").insert({
+                    "user_id": user_id,
+                    "to_email": to_email,
+                    "subject": subject,
+                    "body": body,
+                    "alert_type": alert_type,
+                    "is_urgent": is_urgent,
+                    "occurrences": 1,
+                    "dedupe_key": dedupe_key,
+                    "status": "pending",
+                    "attempts": 0,
+                    "next_attempt_at": send_at.isoformat(),
+                    "created_at": now.isoformat()
+                }).execute()
+            except APIError as e:
+                if dedupe_key and e.code == UNIQUE_VIOLATION:
+                    continue  # another request queued the same alert first; fold into it
+                raise
+            self.enqueued += 1
+            if is_urgent and self._wake is not None:
+                self._wake.set()
+            return result.data[0] if result.data else {}
+        raise RuntimeError(f"Could not queue {alert_type} alert for user {user_id}")
+
+    async def _bump(self, row: dict) -> bool:
+        """Count one more occurrence on a held row; False if it was claimed meanwhile"""
+        occurrences = row.get("occurrences") or 1
+        result = (
+            await self.supabase.table("notification_outbox")
+            .update({"occurrences": occurrences + 1})
+            .eq("id", row["id"])
+            .eq("status", "pending")
+            .eq("occurrences", occurrences)
+            .execute()
+        )
+        return bool(result.data)
+
+    def backoff_seconds(self, attempts: int) -> float:
+        delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * (2 ** max(0, attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    async def run(self):
+        """Deliver due notifications until cancelled"""
+        self._wake = asyncio.Event()
+        print("📬 Notification outbox worker started")
+        while True:
+            try:
+                delivered = await self.deliver_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Outbox worker error: {e}")
+                delivered = 0
+
+            # A full batch means more rows are probably due right now
+            if delivered >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def deliver_due(self) -> int:
+        """Claim and send one batch of due notifications; returns rows handled"""
+        now = datetime.utcnow()
+        rows = (
+            await self.supabase.table("notification_outbox")
+            .select("*")
+            .in_("status", ["pending", "sending"])
+            .lte("next_attempt_at", now.isoformat())
+            .order("next_attempt_at")
+            .limit(self.batch_size)
+            .execute()
+        ).data or []
+
+        handled = set()
+        for row in rows:
+            if row["id"] in handled:
+                continue  # already went out in an earlier digest
+            if not await self._claim(row, now):
+                continue  # another worker got it
+
+            group = [row]
+            if not row.get("is_urgent") and self.digest_window > 0:
+                group += await self._claim_digest_members(row, now)
+            handled.update(item["id"] for item in group)
+            await self._deliver(group)
+
+        return len(rows)
+
+    async def _claim_digest_members(self, leader: dict, now: datetime) -> List[dict]:
+        """Claim the other pending non-urgent alerts for the leader's caregiver"""
+        candidates = (
+            await self.supabase.table("notification_outbox")
+            .select("*")
+            .eq("to_email", leader["to_email"])
+            .eq("status", "pending")
+            .eq("is_urgent", False)
+            .neq("id", leader["id"])
+            .order("created_at")
+            .limit(ALERT_DIGEST_MAX_ITEMS - 1)
+            .execute()
+        ).data or []
+        return [row for row in candidates if await self._claim(row, now)]
+
+    async def _deliver(self, group: List[dict]):
+        """Send one row as-is, or several rows as one digest"""
+        to_email = group[0]["to_email"]
+        if len(group) == 1:
+            subject, body = group[0]["subject"], group[0]["body"]
+            if (group[0].get("occurrences") or 1) > 1:
+                body += f"\n\n(This alert was triggered {group[0]['occurrences']} times.)"
+        else:
+            subject = f"HealthMate Digest: {len(group)} alerts"
+            sections = []
+            for row in group:
+                times = row.get("occurrences") or 1
+                heading = row["subject"] + (f" (x{times})" if times > 1 else "")
+                sections.append(f"• {heading}\n{row['body']}")
+            body = "Here is a summary of recent HealthMate alerts.\n\n" + "\n\n".join(sections)
+
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, smtp_pool.send, SMTP_USERNAME, to_email, build_message(to_email, subject, body)
+            )
+        except Exception as e:
+            for row in group:
+                await self._record_failure(row["id"], row["attempts"] + 1, str(e))
+            return
+
+        sent_at = datetime.utcnow()
+        await self.supabase.table("notification_outbox").update({
+            "status": "sent",
+            "sent_at": sent_at.isoformat(),
+            "digest_id": group[0]["id"] if len(group) > 1 else None,
+            "last_error": None
+        }).in_("id", [row["id"] for row in group]).execute()
+
+        if len(group) > 1:
+            self.digests += 1
+            self.digest_items += len(group)
+        for row in group:
+            lag = (sent_at - parse_timestamp(row["created_at"])).total_seconds()
+            self.delivered += 1
+            self.total_lag_seconds += lag
+            self.max_lag_seconds = max(self.max_lag_seconds, lag)
+
+    async def _claim(self, row: dict, now: datetime) -> bool:
+        if row["attempts"] >= self.max_attempts:
+            # Its lease expired during the last allowed attempt (e.g. the worker died mid-send)
+            await self._expire(row)
+            return False
+        lease_until = now + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+        result = (
+            await self.supabase.table("notification_outbox")
+            .update({
+                "status": "sending",
+                "attempts": row["attempts"] + 1,
+                "next_attempt_at": lease_until.isoformat()
+            })
+            .eq("id", row["id"])
+            .eq("attempts", row["attempts"])
+            .execute()
+        )
+        return bool(result.data)
+
+    async def _expire(self, row: dict):
+        """Fail a row that used up its attempts without recording an outcome"""
+        error = row.get("last_error") or "Delivery lease expired on the final attempt"
+        result = (
+            await self.supabase.table("notification_outbox")
+            .update({"status": "failed", "last_error": error})
+            .eq("id", row["id"])
+            .eq("attempts", row["attempts"])
+            .eq("status", row["status"])
+            .execute()
+        )
+        if result.data:
+            self.dead += 1
+            print(f"❌ Notification {row['id']} failed permanently after {row['attempts']} attempts: {error}")
+
+    async def _record_failure(self, outbox_id: int, attempts: int, error: str):
+        if attempts >= self.max_attempts:
+            self.dead += 1
+            update = {"status": "failed", "last_error": error}
+            print(f"❌ Notification {outbox_id} failed permanently after {attempts} attempts: {error}")
+        else:
+            self.retried += 1
+            retry_at = datetime.utcnow() + timedelta(seconds=self.backoff_seconds(attempts))
+            update = {"status": "pending", "next_attempt_at": retry_at.isoformat(), "last_error": error}
+        await self.supabase.table("notification_outbox").update(update).eq("id", outbox_id).execute()
+
+    async def stats(self) -> dict:
+        """Queue depth, delivery lag and worker counters"""
+        pending = (
+            await self.supabase.table("notification_outbox")
+            .select("created_at", count="exact")
+            .in_("status", ["pending", "sending"])
+            .order("created_at")
+            .limit(1)
+            .execute()
+        )
+        oldest_lag = None
+        if pending.data:
+            oldest_lag = (datetime.utcnow() - parse_timestamp(pending.data[0]["created_at"])).total_seconds()
+
+        return {
+            "queue_depth": pending.count or 0,
+            "oldest_pending_seconds": round(oldest_lag, 1) if oldest_lag is not None else None,
+            "enqueued": self.enqueued,
+            "deduplicated": self.deduplicated,
+            "digest_window_seconds": self.digest_window,
+            "digests_sent": self.digests,
+            "alerts_in_digests": self.digest_items,
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "failed": self.dead,
+            "avg_delivery_lag_seconds": round(self.total_lag_seconds / self.delivered, 2) if self.delivered else 0.0,
+            "max_delivery_lag_seconds": round(self.max_lag_seconds, 2),
+        }
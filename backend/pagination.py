@@ -0,0 +1,60 @@
+"""
+HealthMate AI Guardian - Keyset pagination
+Newest-first paging over (created_at, id) for per-user history tables.
+Each page seeks past the last row of the previous one, so deep pages cost
+the same as the first (backed by the idx_*_user_page indexes).
+"""
+
+import base64
+import json
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "100"))
+# Pages fetch limit + 1 rows; Supabase caps responses at 1000 (max-rows), so stay below it
+SUPABASE_MAX_ROWS = 1000
+PAGE_SIZE_MAX = min(int(os.getenv("PAGE_SIZE_MAX", "999")), SUPABASE_MAX_ROWS - 1)
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(row: dict) -> str:
+    """Opaque cursor pointing just past ``row``"""
+    raw = json.dumps([row["created_at"], row["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+        return created_at, int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def paginate(query, limit: int, cursor: Optional[str] = None,
+             since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """Restrict a select query to one newest-first page
+
+    Fetches one extra row so ``split_page`` can tell whether another page exists.
+    """
+    if since:
+        query = query.gte("created_at", since.isoformat())
+    if until:
+        query = query.lt("created_at", until.isoformat())
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        # The pinned postgrest builder has no or_(), so the filter is added as a raw param
+        query.params = query.params.add(
+            "or", f'(created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{row_id}))'
+        )
+    return query.order("created_at", desc=True).order("id", desc=True).limit(limit + 1)
+
+def split_page(rows: List[dict], limit: int) -> Tuple[List[dict], Optional[str]]:
+    """Trim the look-ahead row and return (page, next cursor or None)"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
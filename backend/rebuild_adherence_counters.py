@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+HealthMate AI Guardian - Adherence Counters Rebuild
+Recomputes adherence_counters from dose_events, e.g. after a bulk import that
+bypassed the API or if the counters ever drift from the recorded doses.
+
+Each user's dose events are replayed in the order they were first recorded
+(by id), so streaks come out as they were built live, with re-marked doses
+counted under their latest status. Counter rows are written with the same
+compare-and-set on ``version`` as live events bump, so a dose recorded while
+a user is being rebuilt makes that user's rebuild start over instead of being
+overwritten.
+
+Usage:
+    python rebuild_adherence_counters.py                 # every user
+    python rebuild_adherence_counters.py --user-id 42
+    python rebuild_adherence_counters.py --dry-run
+"""
+
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+import argparse
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from supabase import create_client, Client
+from adherence import ADHERENCE_MAX_RETRIES, ALL_TIME, COUNTER_FIELDS, apply_dose, empty_counters, week_period
+from notifications import parse_timestamp
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+def fetch_all(query_for_page, chunk_size: int) -> List[dict]:
+    """Every row of a query, keyset-paginated by id"""
+    rows, last_id = [], 0
+    while True:
+        page = query_for_page(last_id).order("id").limit(chunk_size).execute().data or []
+        rows.extend(page)
+        if len(page) < chunk_size:
+            return rows
+        last_id = page[-1]["id"]
+
+def replay_doses(user_id: int, events: List[dict]) -> Dict[str, dict]:
+    """Counter rows by period for one user's dose events, oldest first"""
+    counters: Dict[str, dict] = {}
+    for event in events:
+        for period in (ALL_TIME, week_period(parse_timestamp(event["scheduled_for"]))):
+            current = counters.get(period) or empty_counters(user_id, period)
+            counters[period] = apply_dose(current, event["status"])
+    return counters
+
+def write_counters(supabase: Client, user_id: int, existing: Dict[str, dict], rebuilt: Dict[str, dict]) -> bool:
+    """Compare-and-set the rebuilt rows over ``existing``; False if a live event got in between"""
+    now = datetime.utcnow().isoformat()
+    for period in existing.keys() | rebuilt.keys():
+        row = rebuilt.get(period) or empty_counters(user_id, period)  # stale periods are zeroed
+        values = {field: row[field] for field in COUNTER_FIELDS}
+        if period not in existing:
+            try:
+                supabase.table("adherence_counters").insert(
+                    dict(values, user_id=user_id, period=period, version=1, updated_at=now)
+                ).execute()
+            except Exception:
+                return False  # a live event created the row first
+            continue
+
+        version = existing[period]["version"]
+        result = (
+            supabase.table("adherence_counters")
+            .update(dict(values, version=version + 1, updated_at=now))
+            .eq("user_id", user_id)
+            .eq("period", period)
+            .eq("version", version)
+            .execute()
+        )
+        if not result.data:
+            return False
+    return True
+
+def rebuild_user(supabase: Client, user_id: int, chunk_size: int, dry_run: bool) -> int:
+    """Rebuild one user's counters; returns the number of dose events replayed"""
+    for _ in range(ADHERENCE_MAX_RETRIES):
+        # Read the versions first: any live event after this point bumps one of them
+        existing = {
+            row["period"]: row
+            for row in supabase.table("adherence_counters").select("*").eq("user_id", user_id).execute().data or []
+        }
+        events = fetch_all(
+            lambda last_id: supabase.table("dose_events").select("id,scheduled_for,status")
+            .eq("user_id", user_id).gt("id", last_id),
+            chunk_size,
+        )
+        rebuilt = replay_doses(user_id, events)
+        if dry_run or write_counters(supabase, user_id, existing, rebuilt):
+            return len(events)
+        print(f"  ↳ user {user_id} recorded a dose during the rebuild, retrying")
+    raise RuntimeError(f"Could not rebuild adherence counters for user {user_id}")
+
+def rebuild_adherence_counters(user_id: Optional[int], chunk_size: int, dry_run: bool):
+    """Recompute adherence_counters for one user or everyone from dose_events"""
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    started = time.perf_counter()
+
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        user_ids = [row["id"] for row in fetch_all(
+            lambda last_id: supabase.table("users").select("id").gt("id", last_id), chunk_size
+        )]
+
+    scope = f"user {user_id}" if user_id is not None else f"{len(user_ids)} users"
+    print(f"🔄 Rebuilding adherence counters for {scope}")
+
+    replayed = 0
+    for done, current in enumerate(user_ids, 1):
+        replayed += rebuild_user(supabase, current, chunk_size, dry_run)
+        if done % 100 == 0:
+            print(f"  ↳ {done}/{len(user_ids)} users, {replayed} dose events")
+
+    elapsed = time.perf_counter() - started
+    if dry_run:
+        print(f"🧪 Dry run: {replayed} dose events replayed, nothing written")
+        return
+    print(f"🎉 Done: {len(user_ids)} users from {replayed} dose events in {elapsed:.1f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute adherence_counters from dose_events")
+    parser.add_argument("--user-id", type=int, help="only rebuild this user's counters")
+    parser.add_argument("--chunk-size", type=int, default=999, help="rows fetched per round trip")
+    parser.add_argument("--dry-run", action="store_true", help="compute but do not write anything")
+    args = parser.parse_args()
+
+    rebuild_adherence_counters(args.user_id, args.chunk_size, args.dry_run)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+HealthMate AI Guardian - Vitals Aggregates Rebuild
+Recomputes vitals_daily from the full vitals history, e.g. after a bulk import
+that bypassed the API or if the table ever drifts from the raw readings.
+
+vitals is streamed in keyset-paginated chunks (id > last_id). Each chunk is
+grouped by (user, UTC day) with NumPy in one vectorized pass and merged into
+the running buckets. Row versions are read before the scan, and every bucket
+is written with a compare-and-set on that version, like the live updates in
+vitals_aggregates.py; days that no longer have readings are deleted the same
+way. A bucket a live insert touched in the meantime is re-aggregated from
+that day's readings and retried, so the table is never emptied and no live
+increment is overwritten.
+
+Usage:
+    python rebuild_vitals_aggregates.py                  # every user
+    python rebuild_vitals_aggregates.py --user-id 42
+    python rebuild_vitals_aggregates.py --dry-run
+"""
+
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+import argparse
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from supabase import create_client, Client
+from notifications import parse_timestamp
+from vitals_aggregates import METRICS, VITALS_AGGREGATE_MAX_RETRIES, empty_bucket, merge_bucket
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+VITAL_COLUMNS = "id,user_id,created_at," + ",".join(METRICS.values())
+
+def aggregate_chunk(rows: List[dict]) -> Dict[Tuple[int, str], dict]:
+    """Daily buckets for one chunk of vitals rows, grouped with NumPy"""
+    keys = np.array(
+        [(row["user_id"], parse_timestamp(row["created_at"]).date().toordinal()) for row in rows],
+        dtype=np.int64,
+    )
+    groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    size = len(groups)
+
+    buckets = {}
+    for (user_id, ordinal) in groups.tolist():
+        day = datetime.fromordinal(ordinal).date().isoformat()
+        buckets[(user_id, day)] = empty_bucket(user_id, day)
+    ordered = list(buckets.values())
+
+    for prefix, column in METRICS.items():
+        values = np.array([row.get(column) for row in rows], dtype=np.float64)  # None -> nan
+        present = ~np.isnan(values)
+        counts = np.bincount(inverse, weights=present, minlength=size)
+        sums = np.bincount(inverse, weights=np.where(present, values, 0.0), minlength=size)
+        mins = np.full(size, np.inf)
+        maxs = np.full(size, -np.inf)
+        np.minimum.at(mins, inverse[present], values[present])
+        np.maximum.at(maxs, inverse[present], values[present])
+
+        for bucket, count, total, low, high in zip(ordered, counts.tolist(), sums.tolist(), mins.tolist(), maxs.tolist()):
+            if count:
+                bucket.update({f"{prefix}_count": int(count), f"{prefix}_sum": total,
+                               f"{prefix}_min": low, f"{prefix}_max": high})
+    return buckets
+
+def existing_versions(supabase: Client, user_id: Optional[int], chunk_size: int) -> Dict[Tuple[int, str], int]:
+    """Version of every vitals_daily row in scope, keyed like the rebuilt buckets"""
+    versions = {}
+    offset = 0
+    while True:
+        query = supabase.table("vitals_daily").select("user_id,day,version")
+        if user_id is not None:
+            query = query.eq("user_id", user_id)
+        rows = query.order("user_id").order("day").range(offset, offset + chunk_size - 1).execute().data or []
+        if not rows:
+            return versions
+        for row in rows:
+            versions[(row["user_id"], row["day"])] = row["version"]
+        offset += len(rows)
+
+def write_bucket(supabase: Client, key: Tuple[int, str], bucket: Optional[dict], version: Optional[int]) -> bool:
+    """Compare-and-set one bucket over the row at ``version`` (None: no row); None deletes it"""
+    user_id, day = key
+    if version is None:
+        if bucket is None:
+            return True
+        try:
+            supabase.table("vitals_daily").insert(
+                dict(bucket, version=1, updated_at=datetime.utcnow().isoformat())
+            ).execute()
+            return True
+        except Exception:
+            return False  # a live insert created the bucket first
+
+    query = (
+        supabase.table("vitals_daily").delete() if bucket is None else
+        supabase.table("vitals_daily").update(dict(
+            {k: v for k, v in bucket.items() if k not in ("user_id", "day")},
+            version=version + 1, updated_at=datetime.utcnow().isoformat(),
+        ))
+    )
+    result = query.eq("user_id", user_id).eq("day", day).eq("version", version).execute()
+    return bool(result.data)
+
+def rebuild_day(supabase: Client, key: Tuple[int, str], chunk_size: int):
+    """Re-aggregate one (user, day) from its readings and compare-and-set it, retrying on conflicts"""
+    user_id, day = key
+    next_day = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+    for _ in range(VITALS_AGGREGATE_MAX_RETRIES):
+        # Read the version first: any live update after this point bumps it
+        rows = supabase.table("vitals_daily").select("version").eq("user_id", user_id).eq("day", day).execute().data
+        version = rows[0]["version"] if rows else None
+
+        bucket, last_id = None, 0
+        while True:
+            readings = (
+                supabase.table("vitals").select(VITAL_COLUMNS)
+                .eq("user_id", user_id).gte("created_at", day).lt("created_at", next_day)
+                .gt("id", last_id).order("id").limit(chunk_size).execute()
+            ).data or []
+            if not readings:
+                break
+            partial = aggregate_chunk(readings)[key]
+            bucket = merge_bucket(bucket, partial) if bucket else partial
+            last_id = readings[-1]["id"]
+
+        if write_bucket(supabase, key, bucket, version):
+            return
+    raise RuntimeError(f"Could not rebuild vitals aggregates for user {user_id} ({day})")
+
+def rebuild_vitals_aggregates(user_id: Optional[int], chunk_size: int, dry_run: bool):
+    """Recompute vitals_daily for one user or everyone from the raw readings"""
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    started = time.perf_counter()
+    buckets: Dict[Tuple[int, str], dict] = {}
+    last_id = 0
+    scanned = 0
+
+    scope = f"user {user_id}" if user_id is not None else "all users"
+    print(f"🔄 Rebuilding vitals aggregates for {scope}")
+
+    # Versions before the scan: a live update to any bucket after this point makes its write conflict
+    versions = existing_versions(supabase, user_id, chunk_size)
+
+    while True:
+        query = supabase.table("vitals").select(VITAL_COLUMNS).gt("id", last_id)
+        if user_id is not None:
+            query = query.eq("user_id", user_id)
+        rows = query.order("id").limit(chunk_size).execute().data or []
+        if not rows:
+            break
+
+        for key, partial in aggregate_chunk(rows).items():
+            buckets[key] = merge_bucket(buckets[key], partial) if key in buckets else partial
+        last_id = rows[-1]["id"]
+        scanned += len(rows)
+        print(f"  ↳ up to id {last_id}: {scanned} readings, {len(buckets)} daily buckets")
+
+    stale = versions.keys() - buckets.keys()
+    if dry_run:
+        print(f"🧪 Dry run: {len(buckets)} buckets from {scanned} readings, "
+              f"{len(stale)} stale days, nothing written")
+        return
+
+    conflicts = 0
+    for key in sorted(buckets.keys() | stale):
+        if not write_bucket(supabase, key, buckets.get(key), versions.get(key)):
+            conflicts += 1
+            rebuild_day(supabase, key, chunk_size)
+
+    elapsed = time.perf_counter() - started
+    print(f"🎉 Done: {len(buckets)} daily buckets from {scanned} readings, {len(stale)} stale days "
+          f"checked, {conflicts} re-aggregated after live updates in {elapsed:.1f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute vitals_daily from the vitals history")
+    parser.add_argument("--user-id", type=int, help="only rebuild this user's buckets")
+    parser.add_argument("--chunk-size", type=int, default=999, help="rows fetched and written per round trip")
+    parser.add_argument("--dry-run", action="store_true", help="compute but do not write anything")
+    args = parser.parse_args()
+
+    rebuild_vitals_aggregates(args.user_id, args.chunk_size, args.dry_run)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+HealthMate AI Guardian - Reminder scheduler
+Keeps the next fire time of every active medication's reminder times in one
+min-heap and dispatches due reminders in batches to reminder_dispatches, the
+patient's reminder feed. Caregivers can opt in to a copy through the
+notification outbox (REMINDER_NOTIFY_CAREGIVER).
+Medications are parsed once when loaded or changed, never per tick.
+
+The medications table stays the source of truth when several API workers run
+their own scheduler: due medications are re-read before they fire, new ones
+are picked up by polling, and a dispatch row per dose stops duplicates.
+"""
+
+import asyncio
+import heapq
+import json
+import os
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+REMINDER_TIMEZONE = os.getenv("REMINDER_TIMEZONE", "UTC")  # users have no timezone of their own yet
+REMINDER_TICK_INTERVAL = float(os.getenv("REMINDER_TICK_INTERVAL", "1"))
+REMINDER_DISPATCH_BATCH = int(os.getenv("REMINDER_DISPATCH_BATCH", "500"))
+REMINDER_LOAD_PAGE_SIZE = int(os.getenv("REMINDER_LOAD_PAGE_SIZE", "1000"))
+REMINDER_MOOD_LOOKBACK_HOURS = float(os.getenv("REMINDER_MOOD_LOOKBACK_HOURS", "24"))
+REMINDER_MOOD_ROWS_PER_USER = int(os.getenv("REMINDER_MOOD_ROWS_PER_USER", "5"))
+# Medications created through other workers are picked up by polling for new ids,
+# and a periodic full reload catches reactivated or re-timed ones
+REMINDER_POLL_INTERVAL = float(os.getenv("REMINDER_POLL_INTERVAL", "30"))
+REMINDER_RELOAD_INTERVAL = float(os.getenv("REMINDER_RELOAD_INTERVAL", "3600"))
+REMINDER_NOTIFY_CAREGIVER = os.getenv("REMINDER_NOTIFY_CAREGIVER", "false").lower() == "true"
+
+MEDICATION_COLUMNS = "id,user_id,name,reminder_times,is_active"
+
+_TIME_PATTERN = re.compile(r"([01]\d|2[0-3]):[0-5]\d")
+
+def parse_reminder_times(value) -> List[str]:
+    """Valid "HH:MM" entries of a medication's reminder_times (JSON string or list)"""
+    try:
+        times = json.loads(value) if isinstance(value, str) else list(value or [])
+    except (TypeError, ValueError):
+        return []
+    return sorted({entry for entry in times if isinstance(entry, str) and _TIME_PATTERN.fullmatch(entry)})
+
+@dataclass
+class MedicationSchedule:
+    medication_id: int
+    user_id: int
+    name: str
+    times: List[str]
+    version: int  # heap entries from older versions are stale
+
+class ReminderScheduler:
+    """Min-heap of (fire time, medication, reminder time) for all active medications
+
+    Adding, changing or removing a medication bumps its version instead of
+    searching the heap; stale entries are discarded when they reach the top.
+    Each tick pops only what is due, so its cost depends on the reminders
+    firing, not on how many schedules exist.
+    """
+
+    def __init__(
+        self,
+        supabase,  # async data client (see data_client.py)
+        user_loader: Callable[[List[int]], Awaitable[List[dict]]],
+        message_builder: Callable[[str, str, Optional[dict]], str],
+        tick_interval: float = REMINDER_TICK_INTERVAL,
+        batch_size: int = REMINDER_DISPATCH_BATCH,
+        tz: str = REMINDER_TIMEZONE,
+        notifier: Optional[Callable[[dict, str, str], Awaitable]] = None,  # (user, medication name, message)
+    ):
+        self.supabase = supabase
+        self.user_loader = user_loader
+        self.message_builder = message_builder
+        self.notifier = notifier
+        self.tick_interval = tick_interval
+        self.batch_size = batch_size
+        self.tz = ZoneInfo(tz)
+
+        self._heap: List[Tuple[float, int, str, int]] = []  # (fire_at, medication_id, time, version)
+        self._schedules: Dict[int, MedicationSchedule] = {}
+        self._by_user: Dict[int, Set[int]] = {}
+        self._versions = 0
+        self._max_id = 0  # highest medication id seen, for polling new ones
+        self.loaded = False
+
+        # Metrics
+        self.dispatched = 0
+        self.skipped = 0  # fired entries dropped after re-reading the medication
+        self.notify_errors = 0
+        self.ticks = 0
+        self.last_tick_ms = 0.0
+        self.max_tick_ms = 0.0
+        self.max_lag_seconds = 0.0
+
+    def next_fire(self, reminder_time: str, after: datetime) -> float:
+        """Epoch seconds of the first ``reminder_time`` strictly after ``after`` (aware)"""
+        hour, minute = map(int, reminder_time.split(":"))
+        local = after.astimezone(self.tz)
+        candidate = local.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if candidate <= local:
+            # Recompute from the next local date so DST changes keep the wall-clock time
+            next_day = (local + timedelta(days=1)).date()
+            candidate = datetime(next_day.year, next_day.month, next_day.day, hour, minute, tzinfo=self.tz)
+        return candidate.timestamp()
+
+    def upsert(self, medication: dict, now: Optional[datetime] = None):
+        """(Re)schedule a medication row; inactive ones are removed"""
+        if not medication.get("is_active", True):
+            self.remove(medication["id"])
+            return
+        times = parse_reminder_times(medication.get("reminder_times"))
+        if not times:
+            self.remove(medication["id"])
+            return
+        self._max_id = max(self._max_id, medication["id"])
+
+        current = self._schedules.get(medication["id"])
+        if current and (current.user_id, current.name, current.times) == (medication["user_id"], medication["name"], times):
+            return  # unchanged; keep its heap entries
+
+        self._versions += 1
+        schedule = MedicationSchedule(medication["id"], medication["user_id"], medication["name"], times, self._versions)
+        self.remove(medication["id"])
+        self._schedules[schedule.medication_id] = schedule
+        self._by_user.setdefault(schedule.user_id, set()).add(schedule.medication_id)
+
+        now = now or datetime.now(timezone.utc)
+        for reminder_time in times:
+            heapq.heappush(self._heap, (self.next_fire(reminder_time, now), schedule.medication_id,
+                                        reminder_time, schedule.version))
+
+    def remove(self, medication_id: int):
+        schedule = self._schedules.pop(medication_id, None)
+        if schedule:
+            user_medications = self._by_user.get(schedule.user_id)
+            if user_medications:
+                user_medications.discard(medication_id)
+                if not user_medications:
+                    del self._by_user[schedule.user_id]
+
+    def user_schedules(self, user_id: int) -> List[MedicationSchedule]:
+        return [self._schedules[medication_id] for medication_id in sorted(self._by_user.get(user_id, ()))]
+
+    async def load(self, after_id: int = 0):
+        """Schedule every active medication with an id above ``after_id``, paging by id"""
+        last_id = after_id
+        now = datetime.now(timezone.utc)
+        while True:
+            rows = (
+                await self.supabase.table("medications")
+                .select(MEDICATION_COLUMNS)
+                .eq("is_active", True)
+                .gt("id", last_id)
+                .order("id")
+                .limit(REMINDER_LOAD_PAGE_SIZE)
+                .execute()
+            ).data or []
+            for row in rows:
+                self.upsert(row, now)
+            if len(rows) < REMINDER_LOAD_PAGE_SIZE:
+                break
+            last_id = rows[-1]["id"]
+        if not self.loaded:
+            self.loaded = True
+            print(f"⏰ Reminder scheduler loaded {len(self._schedules)} medications ({len(self._heap)} reminder times)")
+
+    async def run(self):
+        """Load the schedules, then dispatch due reminders until cancelled"""
+        while not self.loaded:
+            try:
+                await self.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Reminder scheduler load error: {e}")
+                await asyncio.sleep(30)
+
+        polled_at = reloaded_at = time.monotonic()
+        while True:
+            try:
+                now = time.monotonic()
+                if now - reloaded_at >= REMINDER_RELOAD_INTERVAL:
+                    await self.load()
+                    reloaded_at = polled_at = now
+                elif now - polled_at >= REMINDER_POLL_INTERVAL:
+                    await self.load(after_id=self._max_id)
+                    polled_at = now
+                dispatched = await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Reminder scheduler error: {e}")
+                dispatched = 0
+            # A full batch means more reminders are probably due right now
+            if dispatched < self.batch_size:
+                await asyncio.sleep(self.tick_interval)
+
+    def pop_due(self, now: float) -> List[Tuple[float, MedicationSchedule, str]]:
+        """Remove up to one batch of due reminders and queue their next occurrence"""
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            fire_at, medication_id, reminder_time, version = heapq.heappop(self._heap)
+            schedule = self._schedules.get(medication_id)
+            if schedule is None or schedule.version != version:
+                continue  # removed or rescheduled since this entry was pushed
+            due.append((fire_at, schedule, reminder_time))
+            fired = datetime.fromtimestamp(fire_at, timezone.utc)
+            heapq.heappush(self._heap, (self.next_fire(reminder_time, fired), medication_id, reminder_time, version))
+        return due
+
+    async def tick(self) -> int:
+        """Dispatch one batch of due reminders; returns how many fired"""
+        started = time.perf_counter()
+        now = time.time()
+        due = self.pop_due(now)
+        if due:
+            await self.dispatch(due, now)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.ticks += 1
+        self.last_tick_ms = elapsed_ms
+        self.max_tick_ms = max(self.max_tick_ms, elapsed_ms)
+        return len(due)
+
+    async def refresh_due(self, due: List[Tuple[float, MedicationSchedule, str]]) -> List[Tuple[float, MedicationSchedule, str]]:
+        """Re-read due medications; drop entries deactivated, deleted or re-timed elsewhere"""
+        medication_ids = sorted({schedule.medication_id for _, schedule, _ in due})
+        rows = (
+            await self.supabase.table("medications")
+            .select(MEDICATION_COLUMNS)
+            .in_("id", medication_ids)
+            .execute()
+        ).data or []
+        current = {row["id"]: row for row in rows}
+        for medication_id in medication_ids:
+            if medication_id in current:
+                self.upsert(current[medication_id])
+            else:
+                self.remove(medication_id)
+
+        fresh = []
+        for fire_at, schedule, reminder_time in due:
+            latest = self._schedules.get(schedule.medication_id)
+            if latest is None or reminder_time not in latest.times:
+                self.skipped += 1
+                continue
+            fresh.append((fire_at, latest, reminder_time))
+        return fresh
+
+    async def dispatch(self, due: List[Tuple[float, MedicationSchedule, str]], now: float):
+        due = await self.refresh_due(due)
+        if not due:
+            return
+        user_ids = sorted({schedule.user_id for _, schedule, _ in due})
+        users = {user["id"]: user for user in await self.user_loader(user_ids)}
+        recent_moods = await self.recent_moods(user_ids)
+
+        rows = []
+        for fire_at, schedule, _ in due:
+            user = users.get(schedule.user_id)
+            if not user:
+                continue
+            recent_mood = recent_moods.get(schedule.user_id)
+            rows.append({
+                "user_id": schedule.user_id,
+                "medication_id": schedule.medication_id,
+                "scheduled_for": datetime.fromtimestamp(fire_at, timezone.utc).isoformat(),
+                "message": self.message_builder(user["name"], schedule.name, recent_mood),
+                "mood_based": recent_mood is not None,
+            })
+            self.max_lag_seconds = max(self.max_lag_seconds, now - fire_at)
+
+        if not rows:
+            return
+        # Only rows this worker inserted come back; another worker may have dispatched the rest
+        inserted = (
+            await self.supabase.table("reminder_dispatches").upsert(
+                rows, on_conflict="medication_id,scheduled_for", ignore_duplicates=True
+            ).execute()
+        ).data or []
+        self.dispatched += len(inserted)
+        if not self.notifier:
+            return
+        names = {schedule.medication_id: schedule.name for _, schedule, _ in due}
+        for row in inserted:
+            try:
+                await self.notifier(users[row["user_id"]], names[row["medication_id"]], row["message"])
+            except Exception as e:
+                self.notify_errors += 1
+                print(f"Reminder notification error for medication {row['medication_id']}: {e}")
+
+    async def recent_moods(self, user_ids: List[int]) -> Dict[int, dict]:
+        """Latest mood log within the lookback window for each user, in one bounded query
+
+        Users crowded out of the row limit by others' frequent logs simply get
+        the neutral reminder text.
+        """
+        since = datetime.now(timezone.utc) - timedelta(hours=REMINDER_MOOD_LOOKBACK_HOURS)
+        rows = (
+            await self.supabase.table("mood_logs")
+            .select("user_id,sentiment_label,created_at")
+            .in_("user_id", user_ids)
+            .gte("created_at", since.isoformat())
+            .order("created_at", desc=True)
+            .limit(len(user_ids) * REMINDER_MOOD_ROWS_PER_USER)
+            .execute()
+        ).data or []
+        latest = {}
+        for row in rows:
+            latest.setdefault(row["user_id"], row)
+        return latest
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "medications": len(self._schedules),
+            "heap_size": len(self._heap),
+            "next_fire_in_seconds": round(self._heap[0][0] - time.time(), 1) if self._heap else None,
+            "dispatched": self.dispatched,
+            "skipped": self.skipped,
+            "notify_errors": self.notify_errors,
+            "ticks": self.ticks,
+            "last_tick_ms": round(self.last_tick_ms, 3),
+            "max_tick_ms": round(self.max_tick_ms, 3),
+            "max_lag_seconds": round(self.max_lag_seconds, 2),
+        }
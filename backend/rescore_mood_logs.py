@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+HealthMate AI Guardian - Mood Log Re-scoring Job
+Re-scores historical mood_logs after SENTIMENT_MODEL (or the backend) changes,
+so insights don't mix labels produced by different models.
+
+mood_logs is streamed in keyset-paginated chunks (id > last_id), each chunk is
+scored in model-sized batches and written back with one bulk upsert. Progress
+is checkpointed in backfill_checkpoints after every chunk, so an interrupted
+run resumes where it stopped.
+
+Quick moods logged before sentiment_model was recorded are the user's own
+emoji choice, not a model result: they are stamped with the emoji marker
+instead of being re-scored from their text.
+
+The mood_logs trigger refreshes each relabelled user's mood_state row in the
+same upsert, so streak alerts never see the old labels.
+
+Usage:
+    python rescore_mood_logs.py                          # start or resume
+    python rescore_mood_logs.py --restart                # ignore the checkpoint
+    python rescore_mood_logs.py --chunk-size 500 --max-rows-per-second 50
+"""
+
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Leave CPU for the API: one intra-op thread unless configured otherwise
+os.environ.setdefault("TORCH_NUM_THREADS", "1")
+
+import argparse
+import asyncio
+import time
+from datetime import datetime
+from supabase import create_client, Client
+from sentiment import EMOJI_MODEL, EMOJI_SENTIMENT, LEXICON_MODEL, SentimentBatcher
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+MOOD_LOG_COLUMNS = "id,user_id,mood_text,sentiment_score,sentiment_label,sentiment_model,created_at"
+
+# (label, score) pairs only POST /mood-logs/quick writes; model scores are never these exact values
+EMOJI_RESULTS = {(emoji["label"], emoji["score"]) for emoji in EMOJI_SENTIMENT.values()}
+
+def is_unmarked_quick_mood(row: dict) -> bool:
+    """A quick mood stored before sentiment_model was recorded (with or without custom text)"""
+    if row.get("sentiment_model") is not None:
+        return False
+    return row["mood_text"].startswith("Quick mood: ") or (row["sentiment_label"], row["sentiment_score"]) in EMOJI_RESULTS
+
+def load_checkpoint(supabase: Client, job_name: str) -> dict:
+    result = supabase.table("backfill_checkpoints").select("*").eq("job_name", job_name).execute()
+    if result.data:
+        return result.data[0]
+    return {"job_name": job_name, "last_id": 0, "rows_processed": 0, "rows_updated": 0, "completed": False}
+
+def save_checkpoint(supabase: Client, checkpoint: dict):
+    checkpoint["updated_at"] = datetime.utcnow().isoformat()
+    supabase.table("backfill_checkpoints").upsert(checkpoint).execute()
+
+async def rescore_mood_logs(chunk_size: int, max_rows_per_second: float, restart: bool, dry_run: bool):
+    """Re-score every mood log whose sentiment_model is not the current one"""
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    batcher = SentimentBatcher()
+    current_model = batcher.cache.model_name
+
+    # Rows already scored by the current model, the lexicon tier or an emoji are left alone
+    up_to_date = {current_model, LEXICON_MODEL, EMOJI_MODEL}
+
+    job_name = f"rescore_mood_logs:{current_model}"
+    checkpoint = load_checkpoint(supabase, job_name)
+    if restart:
+        checkpoint.update(last_id=0, rows_processed=0, rows_updated=0, completed=False)
+    elif checkpoint.get("completed"):
+        print(f"✅ {job_name} already completed ({checkpoint['rows_updated']} rows updated)")
+        return
+
+    print(f"🔄 Re-scoring mood logs with {current_model}, resuming after id {checkpoint['last_id']}")
+
+    while True:
+        chunk_started = time.perf_counter()
+        rows = (
+            supabase.table("mood_logs")
+            .select(MOOD_LOG_COLUMNS)
+            .gt("id", checkpoint["last_id"])
+            .order("id")
+            .limit(chunk_size)
+            .execute()
+        ).data or []
+        if not rows:
+            break
+
+        quick = [row for row in rows if is_unmarked_quick_mood(row)]
+        if quick and not dry_run:
+            supabase.table("mood_logs").upsert([dict(row, sentiment_model=EMOJI_MODEL) for row in quick]).execute()
+        quick_ids = {row["id"] for row in quick}
+
+        stale = [row for row in rows if row["id"] not in quick_ids and row.get("sentiment_model") not in up_to_date]
+        if stale:
+            results = await batcher.score_many([row["mood_text"] for row in stale])
+            updates = [
+                dict(row, sentiment_score=result["score"], sentiment_label=result["label"],
+                     sentiment_model=result["model"])
+                for row, result in zip(stale, results)
+            ]
+            if not dry_run:
+                # One round trip per chunk
+                supabase.table("mood_logs").upsert(updates).execute()
+                # New labels can change mood insights; the API's refresh loop recomputes them
+                supabase.table("user_insights").update({"dirty_at": datetime.utcnow().isoformat()}).in_(
+                    "user_id", sorted({row["user_id"] for row in stale})
+                ).execute()
+
+        checkpoint["last_id"] = rows[-1]["id"]
+        checkpoint["rows_processed"] += len(rows)
+        checkpoint["rows_updated"] += len(stale)
+        if not dry_run:
+            save_checkpoint(supabase, checkpoint)
+        print(f"  ↳ up to id {checkpoint['last_id']}: {checkpoint['rows_processed']} scanned, "
+              f"{checkpoint['rows_updated']} re-scored, {len(quick)} quick moods marked in this chunk")
+
+        # Throttle so the job doesn't starve live traffic
+        if max_rows_per_second > 0:
+            min_seconds = len(rows) / max_rows_per_second
+            elapsed = time.perf_counter() - chunk_started
+            if elapsed < min_seconds:
+                await asyncio.sleep(min_seconds - elapsed)
+
+    checkpoint["completed"] = True
+    if not dry_run:
+        save_checkpoint(supabase, checkpoint)
+    print(f"🎉 Done: {checkpoint['rows_processed']} mood logs scanned, {checkpoint['rows_updated']} re-scored")
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score historical mood logs with the current sentiment model")
+    parser.add_argument("--chunk-size", type=int, default=200, help="rows fetched and written per round trip")
+    parser.add_argument("--max-rows-per-second", type=float, default=100, help="0 disables throttling")
+    parser.add_argument("--restart", action="store_true", help="start from the first row again")
+    parser.add_argument("--dry-run", action="store_true", help="score but do not write anything")
+    args = parser.parse_args()
+
+    asyncio.run(rescore_mood_logs(args.chunk_size, args.max_rows_per_second, args.restart, args.dry_run))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,462 @@
+"""
+HealthMate AI Guardian - Sentiment Analysis
+Lazy-loaded HuggingFace pipeline, result cache and a micro-batching queue
+for mood scoring
+
+transformers/torch are imported on first use (or by a background warm-up),
+so importing this module stays cheap and the API can serve before the model
+is loaded.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from caching import LRUCache
+
+# Configuration below is read at import time, before the apps call load_dotenv()
+load_dotenv()
+
+# Sentiment configuration
+SENTIMENT_MODEL = os.getenv(
+    "SENTIMENT_MODEL",
+    "distilbert-base-uncased-finetuned-sst-2-english",  # lightweight, fast
+)
+SENTIMENT_BATCH_WINDOW_MS = float(os.getenv("SENTIMENT_BATCH_WINDOW_MS", "10"))
+SENTIMENT_MAX_BATCH_SIZE = int(os.getenv("SENTIMENT_MAX_BATCH_SIZE", "16"))
+SENTIMENT_WORKERS = int(os.getenv("SENTIMENT_WORKERS", "1"))
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0"))  # 0 = torch default
+SENTIMENT_BACKEND = os.getenv("SENTIMENT_BACKEND", "torch").lower()  # torch | onnx
+SENTIMENT_ONNX_QUANTIZE = os.getenv("SENTIMENT_ONNX_QUANTIZE", "true").lower() in ("1", "true", "yes")
+SENTIMENT_CACHE_SIZE = int(os.getenv("SENTIMENT_CACHE_SIZE", "10000"))
+SENTIMENT_CACHE_DB = os.getenv("SENTIMENT_CACHE_DB", "")  # e.g. ./sentiment_cache.db; empty = memory only
+SENTIMENT_CASCADE = os.getenv("SENTIMENT_CASCADE", "true").lower() in ("1", "true", "yes")
+SENTIMENT_LEXICON_THRESHOLD = float(os.getenv("SENTIMENT_LEXICON_THRESHOLD", "0.9"))
+
+# Map sentiment labels to more user-friendly terms
+LABEL_MAPPING = {
+    'LABEL_0': 'negative',
+    'LABEL_1': 'neutral',
+    'LABEL_2': 'positive'
+}
+
+# Recorded in mood_logs.sentiment_model for results not produced by the model
+LEXICON_MODEL = "lexicon-v1"
+EMOJI_MODEL = "emoji"
+
+# Quick mood emoji (POST /mood-logs/quick)
+EMOJI_SENTIMENT = {
+    "😃": {"label": "positive", "score": 0.9},
+    "😐": {"label": "neutral", "score": 0.5},
+    "😞": {"label": "negative", "score": 0.1}
+}
+
+# Lexicon for the cheap first tier: token -> weight (positive or negative)
+LEXICON = {
+    # positive
+    "good": 1, "great": 2, "happy": 2, "fine": 1, "better": 1, "well": 1, "nice": 1,
+    "wonderful": 2, "amazing": 2, "awesome": 2, "excellent": 2, "fantastic": 2,
+    "lovely": 2, "love": 2, "loved": 2, "glad": 2, "calm": 1, "relaxed": 1, "rested": 1,
+    "energetic": 1, "grateful": 2, "thankful": 2, "cheerful": 2, "joyful": 2, "joy": 2,
+    "peaceful": 1, "excited": 2, "fun": 1, "enjoyed": 2, "best": 2, "strong": 1, "hopeful": 1,
+    # negative
+    "bad": -1, "sad": -2, "tired": -1, "exhausted": -2, "sick": -2, "ill": -1,
+    "pain": -2, "hurts": -2, "hurt": -2, "aching": -1, "awful": -2, "terrible": -2,
+    "horrible": -2, "worse": -2, "worst": -2, "lonely": -2, "alone": -1, "depressed": -2,
+    "anxious": -2, "worried": -2, "stressed": -2, "scared": -2, "afraid": -2, "angry": -2,
+    "upset": -2, "miserable": -2, "hopeless": -2, "dizzy": -1, "weak": -1, "low": -1,
+    "crying": -2, "cry": -2, "overwhelmed": -2, "sleepless": -1, "nauseous": -2, "hate": -2,
+}
+EMOJI_LEXICON = {
+    "😃": 2, "😀": 2, "😄": 2, "😁": 2, "😊": 2, "🙂": 1, "😍": 2, "🥰": 2, "😌": 1, "👍": 1, "❤️": 2, "🎉": 2,
+    "😐": 0, "😶": 0,
+    "😞": -2, "😔": -2, "😢": -2, "😭": -2, "😟": -2, "😩": -2, "😫": -2, "😡": -2, "😠": -2,
+    "🙁": -1, "☹️": -1, "😰": -2, "😴": -1, "🤒": -2, "🤕": -2, "👎": -1, "💔": -2,
+}
+NEGATORS = {"not", "no", "never", "dont", "don't", "isnt", "isn't", "wasnt", "wasn't",
+            "cant", "can't", "couldnt", "couldn't", "didnt", "didn't", "nothing", "hardly"}
+CONTRASTS = {"but", "though", "although", "however", "yet"}
+_TOKEN_PATTERN = re.compile(
+    "|".join(re.escape(emoji) for emoji in sorted(EMOJI_LEXICON, key=len, reverse=True))
+    + r"|[a-z']+|[^\w\s]"
+)
+
+# Lazy-init sentiment analysis pipelines to reduce boot memory on small hosts
+_sentiment_pipelines: Dict[str, object] = {}
+_pipeline_lock = threading.Lock()
+_pipeline_load_seconds: Dict[str, float] = {}
+
+def backend_name() -> str:
+    """Name of the configured inference backend, e.g. torch or onnx-int8"""
+    if SENTIMENT_BACKEND == "onnx":
+        return "onnx-int8" if SENTIMENT_ONNX_QUANTIZE else "onnx"
+    return "torch"
+
+def get_sentiment_pipeline(model_name: str = SENTIMENT_MODEL):
+    """Return the (cached) sentiment pipeline for a model on the configured backend"""
+    if model_name not in _sentiment_pipelines:
+        with _pipeline_lock:
+            if model_name not in _sentiment_pipelines:
+                started = time.perf_counter()
+                if SENTIMENT_BACKEND == "onnx":
+                    from sentiment_onnx import OnnxSentimentPipeline
+                    _sentiment_pipelines[model_name] = OnnxSentimentPipeline(
+                        model_name, quantize=SENTIMENT_ONNX_QUANTIZE, num_threads=TORCH_NUM_THREADS
+                    )
+                else:
+                    from transformers import pipeline
+                    if TORCH_NUM_THREADS > 0:
+                        import torch
+                        torch.set_num_threads(TORCH_NUM_THREADS)
+                    _sentiment_pipelines[model_name] = pipeline("sentiment-analysis", model=model_name)
+                _pipeline_load_seconds[model_name] = time.perf_counter() - started
+                print(f"✅ Sentiment model {model_name} loaded in {_pipeline_load_seconds[model_name]:.1f}s")
+    return _sentiment_pipelines[model_name]
+
+def model_status(model_name: str = SENTIMENT_MODEL) -> dict:
+    """Whether a model is loaded and how long loading took"""
+    load_seconds = _pipeline_load_seconds.get(model_name)
+    return {
+        "model": model_name,
+        "backend": backend_name(),
+        "loaded": model_name in _sentiment_pipelines,
+        "load_seconds": round(load_seconds, 2) if load_seconds is not None else None,
+    }
+
+def normalize_label(label: str) -> str:
+    """Map a raw model label to positive / neutral / negative"""
+    return LABEL_MAPPING.get(label, label).lower()
+
+def score_texts(texts: List[str], model_name: str = SENTIMENT_MODEL) -> List[dict]:
+    """Score a list of texts in one padded batch"""
+    if not texts:
+        return []
+    results = get_sentiment_pipeline(model_name)(list(texts), batch_size=len(texts), truncation=True)
+    return [
+        {"label": normalize_label(result["label"]), "score": float(result["score"])}
+        for result in results
+    ]
+
+def lexicon_score(text: str) -> dict:
+    """Cheap lexicon/emoji sentiment estimate
+
+    Returns {label, score} where score is the confidence in the label
+    (0.5 = no evidence). Negators flip the next few words, and contrast
+    words ("but", "though") halve the confidence since they usually need
+    the model to resolve.
+    """
+    tokens = _TOKEN_PATTERN.findall(text.lower())
+
+    positive = negative = 0.0
+    negate_until = -1
+    contrast = False
+    for i, token in enumerate(tokens):
+        if token in NEGATORS:
+            negate_until = i + 3
+            continue
+        if token in CONTRASTS:
+            contrast = True
+            continue
+        weight = LEXICON.get(token, EMOJI_LEXICON.get(token, 0))
+        if weight and i <= negate_until:
+            weight = -weight
+        if weight > 0:
+            positive += weight
+        elif weight < 0:
+            negative -= weight
+
+    evidence = positive + negative
+    if evidence == 0 or positive == negative:
+        return {"label": "neutral", "score": 0.5}
+
+    label = "positive" if positive > negative else "negative"
+    agreement = abs(positive - negative) / evidence
+    confidence = agreement * min(1.0, evidence / 2)
+    if contrast:
+        confidence /= 2
+    return {"label": label, "score": round(min(0.95, 0.5 + confidence / 2), 4)}
+
+class SentimentCache:
+    """Content-addressed sentiment results keyed by model name + normalized text
+
+    Results live in an in-memory LRU, optionally backed by a SQLite file so
+    hits survive restarts. The model name (and inference backend) is part of
+    every key and rows for other models are purged on open, so changing
+    SENTIMENT_MODEL or SENTIMENT_BACKEND invalidates the cache automatically.
+    """
+
+    def __init__(self, model_name: str = SENTIMENT_MODEL, maxsize: int = SENTIMENT_CACHE_SIZE,
+                 db_path: str = SENTIMENT_CACHE_DB):
+        if backend_name() != "torch":
+            model_name = f"{model_name}@{backend_name()}"
+        self.model_name = model_name
+        self._memory = LRUCache(maxsize)
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.disk_hits = 0
+        self.misses = 0
+
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS sentiment_cache ("
+                    "key TEXT PRIMARY KEY, model TEXT NOT NULL, label TEXT NOT NULL, score REAL NOT NULL)"
+                )
+                self._db.execute("DELETE FROM sentiment_cache WHERE model != ?", (model_name,))
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: sentiment cache database unavailable: {e}")
+                self._db = None
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    def key(self, text: str) -> str:
+        payload = f"{self.model_name}\0{self.normalize_text(text)}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def get(self, text: str) -> Optional[dict]:
+        """Look a text up in memory, then on disk"""
+        key = self.key(text)
+        result = self._memory.get(key)
+        if result is not None:
+            return result
+
+        if self._db is not None:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT label, score FROM sentiment_cache WHERE key = ?", (key,)
+                ).fetchone()
+            if row:
+                result = {"label": row[0], "score": row[1]}
+                self._memory.put(key, result)
+                self.disk_hits += 1
+                return result
+
+        self.misses += 1
+        return None
+
+    def put_many(self, texts: List[str], results: List[dict]):
+        rows = []
+        for text, result in zip(texts, results):
+            key = self.key(text)
+            self._memory.put(key, result)
+            rows.append((key, self.model_name, result["label"], result["score"]))
+
+        if self._db is not None and rows:
+            with self._db_lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO sentiment_cache (key, model, label, score) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                self._db.commit()
+
+    def stats(self) -> dict:
+        memory = self._memory.stats()
+        lookups = memory["hits"] + self.disk_hits + self.misses
+        return {
+            "model": self.model_name,
+            "size": memory["size"],
+            "maxsize": memory["maxsize"],
+            "evictions": memory["evictions"],
+            "memory_hits": memory["hits"],
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((memory["hits"] + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "persistent": self._db is not None,
+        }
+
+class SentimentBatcher:
+    """Gathers concurrent mood texts and scores them as a single batch
+
+    Batches run on a dedicated thread pool so the forward pass never blocks
+    the event loop; at most ``workers`` batches are in flight at once.
+    Texts the lexicon tier is confident about, and cached texts, are
+    answered without queueing; only the rest escalate to the model.
+    """
+
+    def __init__(
+        self,
+        model_name: str = SENTIMENT_MODEL,
+        window_ms: float = SENTIMENT_BATCH_WINDOW_MS,
+        max_batch_size: int = SENTIMENT_MAX_BATCH_SIZE,
+        workers: int = SENTIMENT_WORKERS,
+        cache: Optional[SentimentCache] = None,
+        cascade: bool = SENTIMENT_CASCADE,
+        lexicon_threshold: float = SENTIMENT_LEXICON_THRESHOLD,
+    ):
+        self.model_name = model_name
+        self.cache = cache if cache is not None else SentimentCache(model_name)
+        self.cascade = cascade
+        self.lexicon_threshold = lexicon_threshold
+        self.window_ms = window_ms
+        self.max_batch_size = max(1, max_batch_size)
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sentiment")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight = 0
+        self._pending: List[Tuple[str, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        # Metrics
+        self.batches = 0
+        self.items = 0
+        self.full_batches = 0
+        self.total_wait_ms = 0.0
+        self.total_inference_ms = 0.0
+        self.requests = 0
+        self.lexicon_answered = 0
+
+    async def score(self, text: str) -> dict:
+        """Queue one text and wait for its {label, score, model}"""
+        quick = self._lexicon_tier([text])[0]
+        if quick is not None:
+            return quick
+
+        cached = self.cache.get(text)
+        if cached is not None:
+            return dict(cached, model=self.cache.model_name)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_ms / 1000, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Hand the pending texts to a batch run"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def warm_up(self):
+        """Load the model on the sentiment thread pool without blocking requests"""
+        try:
+            await self.run_in_executor(get_sentiment_pipeline, self.model_name)
+        except Exception as e:
+            print(f"Warning: sentiment model warm-up failed: {e}")
+
+    async def run_in_executor(self, func, *args):
+        """Run a blocking inference call on the sentiment thread pool"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        async with self._slots:
+            self._in_flight += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+            finally:
+                self._in_flight -= 1
+
+    def _lexicon_tier(self, texts: List[str]) -> List[Optional[dict]]:
+        """Lexicon results for confident texts, None for texts to escalate"""
+        self.requests += len(texts)
+        if not self.cascade:
+            return [None] * len(texts)
+
+        results: List[Optional[dict]] = []
+        for text in texts:
+            estimate = lexicon_score(text)
+            if estimate["label"] != "neutral" and estimate["score"] >= self.lexicon_threshold:
+                self.lexicon_answered += 1
+                results.append(dict(estimate, model=LEXICON_MODEL))
+            else:
+                results.append(None)
+        return results
+
+    def _score_batch(self, texts: List[str]):
+        started = time.perf_counter()
+        normalized = [SentimentCache.normalize_text(text) for text in texts]
+        unique_texts = list(dict.fromkeys(normalized))
+        unique_results = score_texts(unique_texts, self.model_name)
+        finished = time.perf_counter()
+        self.cache.put_many(unique_texts, unique_results)
+        by_text = dict(zip(unique_texts, unique_results))
+        return [by_text[text] for text in normalized], started, finished
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future, float]]):
+        try:
+            results, started, finished = await self.run_in_executor(
+                self._score_batch, [text for text, _, _ in batch]
+            )
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self._record_batch([queued_at for _, _, queued_at in batch], started, finished)
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(dict(result, model=self.cache.model_name))
+
+    async def score_many(self, texts: List[str]) -> List[dict]:
+        """Score many texts in model-sized batches, skipping cached ones"""
+        queued_at = time.perf_counter()
+        results = self._lexicon_tier(texts)
+        results = [result if result is not None else self.cache.get(text) for text, result in zip(texts, results)]
+        misses = [i for i, result in enumerate(results) if result is None]
+
+        for start in range(0, len(misses), self.max_batch_size):
+            chunk = misses[start:start + self.max_batch_size]
+            scored, started, finished = await self.run_in_executor(
+                self._score_batch, [texts[i] for i in chunk]
+            )
+            self._record_batch([queued_at] * len(chunk), started, finished)
+            for i, result in zip(chunk, scored):
+                results[i] = result
+
+        return [dict({"model": self.cache.model_name}, **result) for result in results]
+
+    def _record_batch(self, queued_at: List[float], started: float, finished: float):
+        self.batches += 1
+        self.items += len(queued_at)
+        if len(queued_at) >= self.max_batch_size:
+            self.full_batches += 1
+        self.total_wait_ms += sum((started - queued) * 1000 for queued in queued_at)
+        self.total_inference_ms += (finished - started) * 1000
+
+    def stats(self) -> dict:
+        """Batch fill-rate and latency metrics"""
+        return {
+            "model": self.model_name,
+            "backend": backend_name(),
+            "window_ms": self.window_ms,
+            "max_batch_size": self.max_batch_size,
+            "batches": self.batches,
+            "items": self.items,
+            "pending": len(self._pending),
+            "workers": self.workers,
+            "in_flight": self._in_flight,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "fill_rate": round(self.items / (self.batches * self.max_batch_size), 4) if self.batches else 0.0,
+            "full_batches": self.full_batches,
+            "avg_queue_wait_ms": round(self.total_wait_ms / self.items, 2) if self.items else 0.0,
+            "avg_batch_inference_ms": round(self.total_inference_ms / self.batches, 2) if self.batches else 0.0,
+            "cascade": {
+                "enabled": self.cascade,
+                "lexicon_threshold": self.lexicon_threshold,
+                "requests": self.requests,
+                "lexicon_answered": self.lexicon_answered,
+                "escalated": self.requests - self.lexicon_answered,
+                "escalation_rate": round(1 - self.lexicon_answered / self.requests, 4) if self.requests else 0.0,
+            },
+        }
@@ -0,0 +1,147 @@
+"""
+HealthMate AI Guardian - ONNX Runtime sentiment backend
+Exports the configured model to ONNX (optionally int8-quantized) and serves it
+with the same label/score interface as the transformers pipeline
+
+Needs the optional ``onnxruntime`` and ``onnx`` packages.
+"""
+
+import os
+import re
+from typing import Dict, List, Union
+
+SENTIMENT_ONNX_DIR = os.getenv("SENTIMENT_ONNX_DIR", "./onnx_models")
+
+def onnx_model_dir(model_name: str, model_dir: str = SENTIMENT_ONNX_DIR) -> str:
+    """Directory holding the exported files for a model"""
+    return os.path.join(model_dir, re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name))
+
+def export_onnx_model(model_name: str, quantize: bool = True, model_dir: str = SENTIMENT_ONNX_DIR) -> str:
+    """Export a HuggingFace sequence-classification model to ONNX
+
+    Returns the path of the .onnx file to serve. The tokenizer and config are
+    saved next to it so serving does not need the torch weights.
+    """
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    output_dir = onnx_model_dir(model_name, model_dir)
+    fp32_path = os.path.join(output_dir, "model.onnx")
+    int8_path = os.path.join(output_dir, "model.int8.onnx")
+    os.makedirs(output_dir, exist_ok=True)
+
+    if not os.path.exists(fp32_path):
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        model.eval()
+
+        class LogitsOnly(torch.nn.Module):
+            def __init__(self, wrapped):
+                super().__init__()
+                self.wrapped = wrapped
+
+            def forward(self, input_ids, attention_mask):
+                return self.wrapped(input_ids=input_ids, attention_mask=attention_mask).logits
+
+        sample = tokenizer(["HealthMate export sample"], return_tensors="pt")
+        with torch.no_grad():
+            torch.onnx.export(
+                LogitsOnly(model),
+                (sample["input_ids"], sample["attention_mask"]),
+                fp32_path,
+                input_names=["input_ids", "attention_mask"],
+                output_names=["logits"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "logits": {0: "batch"},
+                },
+                opset_version=14,
+            )
+        tokenizer.save_pretrained(output_dir)
+        model.config.save_pretrained(output_dir)
+        print(f"✅ Exported {model_name} to {fp32_path}")
+
+    if not quantize:
+        return fp32_path
+
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        print(f"✅ Quantized {model_name} to {int8_path}")
+
+    return int8_path
+
+class OnnxSentimentPipeline:
+    """ONNX Runtime drop-in for ``pipeline("sentiment-analysis")``"""
+
+    def __init__(self, model_name: str, quantize: bool = True, model_dir: str = SENTIMENT_ONNX_DIR,
+                 num_threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoConfig, AutoTokenizer
+
+        self.model_name = model_name
+        self.quantize = quantize
+        model_path = export_onnx_model(model_name, quantize, model_dir)
+        output_dir = os.path.dirname(model_path)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(output_dir)
+        self.id2label: Dict[int, str] = AutoConfig.from_pretrained(output_dir).id2label
+
+    def __call__(self, texts: Union[str, List[str]], batch_size: int = 1, truncation: bool = True, **kwargs) -> List[dict]:
+        import numpy as np
+
+        if isinstance(texts, str):
+            texts = [texts]
+        batch_size = max(1, batch_size or 1)
+
+        results = []
+        for start in range(0, len(texts), batch_size):
+            chunk = list(texts[start:start + batch_size])
+            encoded = self.tokenizer(chunk, padding=True, truncation=truncation, return_tensors="np")
+            feed = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            logits = self.session.run(["logits"], feed)[0]
+
+            # Softmax, matching the transformers text-classification postprocess
+            logits = logits - logits.max(axis=-1, keepdims=True)
+            probabilities = np.exp(logits)
+            probabilities /= probabilities.sum(axis=-1, keepdims=True)
+
+            for row in probabilities:
+                best = int(row.argmax())
+                results.append({"label": self.id2label[best], "score": float(row[best])})
+        return results
+
+def check_parity(texts: List[str], model_name: str, quantize: bool = True,
+                 model_dir: str = SENTIMENT_ONNX_DIR) -> dict:
+    """Compare ONNX Runtime outputs against the torch pipeline on the same texts"""
+    from transformers import pipeline
+
+    torch_results = pipeline("sentiment-analysis", model=model_name)(list(texts), batch_size=8, truncation=True)
+    onnx_results = OnnxSentimentPipeline(model_name, quantize, model_dir)(list(texts), batch_size=8)
+
+    label_matches = sum(t["label"] == o["label"] for t, o in zip(torch_results, onnx_results))
+    score_diffs = [
+        abs(t["score"] - o["score"])
+        for t, o in zip(torch_results, onnx_results)
+        if t["label"] == o["label"]
+    ]
+    return {
+        "model": model_name,
+        "quantized": quantize,
+        "texts": len(texts),
+        "label_agreement": round(label_matches / len(texts), 4) if texts else 1.0,
+        "max_score_diff": round(max(score_diffs), 6) if score_diffs else 0.0,
+        "mean_score_diff": round(sum(score_diffs) / len(score_diffs), 6) if score_diffs else 0.0,
+        "mismatches": [
+            {"text": text, "torch": t, "onnx": o}
+            for text, t, o in zip(texts, torch_results, onnx_results)
+            if t["label"] != o["label"]
+        ],
+    }
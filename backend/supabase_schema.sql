@@ -31,9 +31,13 @@ CREATE TABLE IF NOT EXISTS mood_logs (
     mood_text TEXT NOT NULL,
     sentiment_score FLOAT NOT NULL,
     sentiment_label VARCHAR(50) NOT NULL,
+    sentiment_model VARCHAR(255), -- model/backend that produced the label
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Existing databases: record which model scored each mood log
+ALTER TABLE mood_logs ADD COLUMN IF NOT EXISTS sentiment_model VARCHAR(255);
+
 -- Create vitals table
 CREATE TABLE IF NOT EXISTS vitals (
     id SERIAL PRIMARY KEY,
@@ -45,18 +49,272 @@ CREATE TABLE IF NOT EXISTS vitals (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Create backfill_checkpoints table (progress of resumable background jobs)
+CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+    job_name VARCHAR(255) PRIMARY KEY,
+    last_id INTEGER NOT NULL DEFAULT 0,
+    rows_processed INTEGER NOT NULL DEFAULT 0,
+    rows_updated INTEGER NOT NULL DEFAULT 0,
+    completed BOOLEAN DEFAULT FALSE,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Create notification_outbox table (durable queue of caregiver emails)
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    to_email VARCHAR(255) NOT NULL,
+    subject VARCHAR(255) NOT NULL,
+    body TEXT NOT NULL,
+    alert_type VARCHAR(50), -- negative_mood, consecutive_negative_moods, ...
+    is_urgent BOOLEAN DEFAULT FALSE,
+    occurrences INTEGER NOT NULL DEFAULT 1, -- duplicates folded into this alert
+    digest_id INTEGER, -- outbox row whose digest email carried this alert
+    dedupe_key VARCHAR(100), -- user_id:alert_type while the alert is held for the digest window
+    status VARCHAR(20) NOT NULL DEFAULT 'pending', -- pending, sending, sent, failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    sent_at TIMESTAMP WITH TIME ZONE
+);
+ALTER TABLE notification_outbox ADD COLUMN IF NOT EXISTS alert_type VARCHAR(50);
+ALTER TABLE notification_outbox ADD COLUMN IF NOT EXISTS is_urgent BOOLEAN DEFAULT FALSE;
+ALTER TABLE notification_outbox ADD COLUMN IF NOT EXISTS occurrences INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE notification_outbox ADD COLUMN IF NOT EXISTS digest_id INTEGER;
+ALTER TABLE notification_outbox ADD COLUMN IF NOT EXISTS dedupe_key VARCHAR(100);
+
+-- Create reminder_dispatches table (medication reminders fired by the scheduler)
+CREATE TABLE IF NOT EXISTS reminder_dispatches (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    medication_id INTEGER NOT NULL REFERENCES medications(id) ON DELETE CASCADE,
+    scheduled_for TIMESTAMP WITH TIME ZONE NOT NULL,
+    message TEXT NOT NULL,
+    mood_based BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE (medication_id, scheduled_for) -- one dispatch per dose, however many workers run
+);
+
+-- Create dose_events table (scheduled doses marked taken, late or skipped)
+CREATE TABLE IF NOT EXISTS dose_events (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    medication_id INTEGER NOT NULL REFERENCES medications(id) ON DELETE CASCADE,
+    scheduled_for TIMESTAMP WITH TIME ZONE NOT NULL,
+    status VARCHAR(10) NOT NULL, -- taken, late, skipped
+    recorded_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE (medication_id, scheduled_for)
+);
+
+-- Create adherence_counters table (per-user dose counters, updated on every dose event)
+CREATE TABLE IF NOT EXISTS adherence_counters (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    period VARCHAR(10) NOT NULL, -- 'all' or ISO week, e.g. '2024-W07'
+    doses_total INTEGER NOT NULL DEFAULT 0,
+    doses_taken INTEGER NOT NULL DEFAULT 0,
+    doses_late INTEGER NOT NULL DEFAULT 0,
+    doses_skipped INTEGER NOT NULL DEFAULT 0,
+    current_streak INTEGER NOT NULL DEFAULT 0,
+    best_streak INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0, -- compare-and-set guard for concurrent updates
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_id, period)
+);
+
+-- Record a dose event and fold it into the all-time and weekly counters in one
+-- transaction; the dose row lock serializes concurrent marks of the same dose
+CREATE OR REPLACE FUNCTION record_dose_event(
+    p_user_id INTEGER,
+    p_medication_id INTEGER,
+    p_scheduled_for TIMESTAMP WITH TIME ZONE,
+    p_status VARCHAR,
+    p_week VARCHAR
+) RETURNS SETOF dose_events AS $$
+DECLARE
+    event dose_events;
+    old_status VARCHAR(10);
+BEGIN
+    INSERT INTO dose_events (user_id, medication_id, scheduled_for, status)
+    VALUES (p_user_id, p_medication_id, p_scheduled_for, p_status)
+    ON CONFLICT (medication_id, scheduled_for) DO NOTHING
+    RETURNING * INTO event;
+
+    IF event.id IS NULL THEN
+        SELECT * INTO event FROM dose_events
+        WHERE medication_id = p_medication_id AND scheduled_for = p_scheduled_for
+        FOR UPDATE;
+        old_status := event.status;
+        IF old_status = p_status THEN
+            RETURN NEXT event; -- already recorded; counters unchanged
+            RETURN;
+        END IF;
+        UPDATE dose_events SET status = p_status, recorded_at = NOW()
+        WHERE id = event.id
+        RETURNING * INTO event;
+    END IF;
+
+    INSERT INTO adherence_counters (user_id, period)
+    VALUES (p_user_id, 'all'), (p_user_id, p_week)
+    ON CONFLICT (user_id, period) DO NOTHING;
+
+    -- Lock the counter rows in a fixed order so concurrent events for a user cannot deadlock
+    PERFORM 1 FROM adherence_counters
+    WHERE user_id = p_user_id AND period IN ('all', p_week)
+    ORDER BY period
+    FOR UPDATE;
+
+    -- A new dose moves the totals and the streak; a re-mark only corrects the totals
+    UPDATE adherence_counters SET
+        doses_total = doses_total + (old_status IS NULL)::INTEGER,
+        doses_taken = doses_taken + (p_status = 'taken')::INTEGER - (old_status IS NOT DISTINCT FROM 'taken')::INTEGER,
+        doses_late = doses_late + (p_status = 'late')::INTEGER - (old_status IS NOT DISTINCT FROM 'late')::INTEGER,
+        doses_skipped = doses_skipped + (p_status = 'skipped')::INTEGER - (old_status IS NOT DISTINCT FROM 'skipped')::INTEGER,
+        current_streak = CASE
+            WHEN old_status IS NOT NULL THEN current_streak
+            WHEN p_status = 'taken' THEN current_streak + 1
+            ELSE 0
+        END,
+        best_streak = CASE
+            WHEN old_status IS NULL AND p_status = 'taken' THEN GREATEST(best_streak, current_streak + 1)
+            ELSE best_streak
+        END,
+        version = version + 1,
+        updated_at = NOW()
+    WHERE user_id = p_user_id AND period IN ('all', p_week);
+
+    RETURN NEXT event;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Create vitals_daily table (per-user daily vitals aggregates, updated on insert)
+CREATE TABLE IF NOT EXISTS vitals_daily (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day DATE NOT NULL, -- UTC date of the readings
+    systolic_count INTEGER NOT NULL DEFAULT 0,
+    systolic_sum FLOAT NOT NULL DEFAULT 0,
+    systolic_min FLOAT,
+    systolic_max FLOAT,
+    diastolic_count INTEGER NOT NULL DEFAULT 0,
+    diastolic_sum FLOAT NOT NULL DEFAULT 0,
+    diastolic_min FLOAT,
+    diastolic_max FLOAT,
+    sugar_count INTEGER NOT NULL DEFAULT 0,
+    sugar_sum FLOAT NOT NULL DEFAULT 0,
+    sugar_min FLOAT,
+    sugar_max FLOAT,
+    sleep_count INTEGER NOT NULL DEFAULT 0,
+    sleep_sum FLOAT NOT NULL DEFAULT 0,
+    sleep_min FLOAT,
+    sleep_max FLOAT,
+    version INTEGER NOT NULL DEFAULT 0, -- compare-and-set guard for concurrent updates
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_id, day)
+);
+
+-- Create user_insights table (materialized insights, recomputed after write events)
+CREATE TABLE IF NOT EXISTS user_insights (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    mood_insight TEXT,
+    medication_insight TEXT,
+    streak_count INTEGER NOT NULL DEFAULT 0,
+    streak_type VARCHAR(20) NOT NULL DEFAULT 'medication',
+    computed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    dirty_at TIMESTAMP WITH TIME ZONE, -- latest write not reflected yet; NULL when up to date
+    refresh_lease_until TIMESTAMP WITH TIME ZONE -- worker recomputing the row holds it until then
+);
+ALTER TABLE user_insights ADD COLUMN IF NOT EXISTS dirty_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE user_insights ADD COLUMN IF NOT EXISTS refresh_lease_until TIMESTAMP WITH TIME ZONE;
+
+-- Create mood_state table (each user's latest sentiment labels, kept by a trigger on mood_logs)
+CREATE TABLE IF NOT EXISTS mood_state (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    recent_labels TEXT[] NOT NULL DEFAULT '{}', -- newest first, at most 8
+    recent_logged_at TIMESTAMP WITH TIME ZONE[] NOT NULL DEFAULT '{}', -- created_at of each label
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Refresh a user's mood_state in the same transaction as every mood_logs write
+-- (including re-scoring), so all API workers see the same streaks
+CREATE OR REPLACE FUNCTION refresh_mood_state() RETURNS TRIGGER AS $$
+DECLARE
+    target INTEGER;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        target := OLD.user_id;
+    ELSE
+        target := NEW.user_id;
+        INSERT INTO mood_state (user_id) VALUES (target) ON CONFLICT (user_id) DO NOTHING;
+    END IF;
+
+    -- Concurrent mood writes for a user take turns; each then reads the other's committed log
+    PERFORM 1 FROM mood_state WHERE user_id = target FOR UPDATE;
+
+    UPDATE mood_state SET
+        recent_labels = COALESCE(latest.labels, '{}'),
+        recent_logged_at = COALESCE(latest.logged_at, '{}'),
+        updated_at = NOW()
+    FROM (
+        SELECT array_agg(sentiment_label ORDER BY created_at DESC, id DESC) AS labels,
+               array_agg(created_at ORDER BY created_at DESC, id DESC) AS logged_at
+        FROM (
+            SELECT id, sentiment_label, created_at FROM mood_logs
+            WHERE user_id = target
+            ORDER BY created_at DESC, id DESC
+            LIMIT 8
+        ) recent
+    ) latest
+    WHERE mood_state.user_id = target;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS mood_logs_refresh_mood_state ON mood_logs;
+CREATE TRIGGER mood_logs_refresh_mood_state
+AFTER INSERT OR DELETE OR UPDATE OF sentiment_label, created_at ON mood_logs
+FOR EACH ROW EXECUTE FUNCTION refresh_mood_state();
+
+-- Seed mood_state for mood logs written before the trigger existed
+INSERT INTO mood_state (user_id, recent_labels, recent_logged_at)
+SELECT user_id,
+       (array_agg(sentiment_label ORDER BY created_at DESC, id DESC))[1:8],
+       (array_agg(created_at ORDER BY created_at DESC, id DESC))[1:8]
+FROM mood_logs
+GROUP BY user_id
+ON CONFLICT (user_id) DO NOTHING;
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_medications_user_id ON medications(user_id);
 CREATE INDEX IF NOT EXISTS idx_mood_logs_user_id ON mood_logs(user_id);
 CREATE INDEX IF NOT EXISTS idx_mood_logs_created_at ON mood_logs(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_vitals_user_id ON vitals(user_id);
 CREATE INDEX IF NOT EXISTS idx_vitals_created_at ON vitals(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_medications_user_page ON medications(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_mood_logs_user_page ON mood_logs(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_vitals_user_page ON vitals(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_due ON notification_outbox(status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_alert ON notification_outbox(user_id, alert_type, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_recipient ON notification_outbox(to_email, status);
+-- At most one held alert per (user, alert type); concurrent repeats fold into it
+CREATE UNIQUE INDEX IF NOT EXISTS idx_notification_outbox_dedupe ON notification_outbox(dedupe_key) WHERE status = 'pending' AND attempts = 0;
+CREATE INDEX IF NOT EXISTS idx_reminder_dispatches_user ON reminder_dispatches(user_id, scheduled_for DESC);
+CREATE INDEX IF NOT EXISTS idx_dose_events_user ON dose_events(user_id, scheduled_for DESC);
+CREATE INDEX IF NOT EXISTS idx_user_insights_dirty ON user_insights(dirty_at) WHERE dirty_at IS NOT NULL;
 
 -- Enable Row Level Security (RLS)
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
 ALTER TABLE medications ENABLE ROW LEVEL SECURITY;
 ALTER TABLE mood_logs ENABLE ROW LEVEL SECURITY;
 ALTER TABLE vitals ENABLE ROW LEVEL SECURITY;
+ALTER TABLE backfill_checkpoints ENABLE ROW LEVEL SECURITY;
+ALTER TABLE notification_outbox ENABLE ROW LEVEL SECURITY;
+ALTER TABLE reminder_dispatches ENABLE ROW LEVEL SECURITY;
+ALTER TABLE dose_events ENABLE ROW LEVEL SECURITY;
+ALTER TABLE adherence_counters ENABLE ROW LEVEL SECURITY;
+ALTER TABLE vitals_daily ENABLE ROW LEVEL SECURITY;
+ALTER TABLE user_insights ENABLE ROW LEVEL SECURITY;
+ALTER TABLE mood_state ENABLE ROW LEVEL SECURITY;
 
 -- Create policies for public access (for hackathon demo)
 -- In production, you'd want more restrictive policies
@@ -64,6 +322,14 @@ CREATE POLICY "Allow all operations on users" ON users FOR ALL USING (true);
 CREATE POLICY "Allow all operations on medications" ON medications FOR ALL USING (true);
 CREATE POLICY "Allow all operations on mood_logs" ON mood_logs FOR ALL USING (true);
 CREATE POLICY "Allow all operations on vitals" ON vitals FOR ALL USING (true);
+CREATE POLICY "Allow all operations on backfill_checkpoints" ON backfill_checkpoints FOR ALL USING (true);
+CREATE POLICY "Allow all operations on notification_outbox" ON notification_outbox FOR ALL USING (true);
+CREATE POLICY "Allow all operations on reminder_dispatches" ON reminder_dispatches FOR ALL USING (true);
+CREATE POLICY "Allow all operations on dose_events" ON dose_events FOR ALL USING (true);
+CREATE POLICY "Allow all operations on adherence_counters" ON adherence_counters FOR ALL USING (true);
+CREATE POLICY "Allow all operations on vitals_daily" ON vitals_daily FOR ALL USING (true);
+CREATE POLICY "Allow all operations on user_insights" ON user_insights FOR ALL USING (true);
+CREATE POLICY "Allow all operations on mood_state" ON mood_state FOR ALL USING (true);
 
 -- Insert sample data for testing
 INSERT INTO users (name, age, caregiver_email) VALUES 
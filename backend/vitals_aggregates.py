@@ -0,0 +1,176 @@
+"""
+HealthMate AI Guardian - Vitals aggregates
+Per-user daily buckets (count, sum, min, max for each vital) kept in
+vitals_daily and updated on every insert. Rolling 7/30/90-day summaries are
+combined from at most 90 buckets, never from the raw readings.
+"""
+
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from notifications import parse_timestamp
+
+# Load environment variables
+load_dotenv()
+
+VITALS_AGGREGATE_MAX_RETRIES = int(os.getenv("VITALS_AGGREGATE_MAX_RETRIES", "5"))
+SUMMARY_WINDOWS = (7, 30, 90)
+
+# Bucket column prefix -> vitals column
+METRICS = {
+    "systolic": "blood_pressure_systolic",
+    "diastolic": "blood_pressure_diastolic",
+    "sugar": "blood_sugar",
+    "sleep": "sleep_hours",
+}
+
+def empty_bucket(user_id: int, day: str) -> dict:
+    bucket = {"user_id": user_id, "day": day, "version": 0}
+    for prefix in METRICS:
+        bucket.update({f"{prefix}_count": 0, f"{prefix}_sum": 0.0, f"{prefix}_min": None, f"{prefix}_max": None})
+    return bucket
+
+def merge_bucket(bucket: dict, other: dict) -> dict:
+    """Combine two buckets of the same user and day"""
+    merged = dict(bucket)
+    for prefix in METRICS:
+        if not other[f"{prefix}_count"]:
+            continue
+        merged[f"{prefix}_count"] += other[f"{prefix}_count"]
+        merged[f"{prefix}_sum"] += other[f"{prefix}_sum"]
+        for key, pick in ((f"{prefix}_min", min), (f"{prefix}_max", max)):
+            merged[key] = other[key] if merged[key] is None else pick(merged[key], other[key])
+    return merged
+
+def bucket_readings(vitals: Iterable[dict]) -> Dict[Tuple[int, str], dict]:
+    """Group vitals rows into partial buckets keyed by (user_id, UTC day)"""
+    buckets: Dict[Tuple[int, str], dict] = {}
+    for vital in vitals:
+        day = parse_timestamp(vital["created_at"]).date().isoformat()
+        key = (vital["user_id"], day)
+        bucket = buckets.get(key) or empty_bucket(*key)
+        for prefix, column in METRICS.items():
+            value = vital.get(column)
+            if value is None:
+                continue
+            bucket[f"{prefix}_count"] += 1
+            bucket[f"{prefix}_sum"] += value
+            bucket[f"{prefix}_min"] = value if bucket[f"{prefix}_min"] is None else min(bucket[f"{prefix}_min"], value)
+            bucket[f"{prefix}_max"] = value if bucket[f"{prefix}_max"] is None else max(bucket[f"{prefix}_max"], value)
+        buckets[key] = bucket
+    return buckets
+
+def trend_per_day(points: List[Tuple[float, float]]) -> Optional[float]:
+    """Least-squares slope of (day offset, daily mean) points"""
+    if len(points) < 2:
+        return None
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if not variance:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+def summarize(buckets: List[dict], window: int, today: date) -> dict:
+    """Rolling summary of the last ``window`` days (today included)"""
+    start = today - timedelta(days=window - 1)
+    in_window = [bucket for bucket in buckets if date.fromisoformat(str(bucket["day"])[:10]) >= start]
+
+    summary = {}
+    for prefix, column in METRICS.items():
+        count = sum(bucket[f"{prefix}_count"] for bucket in in_window)
+        if not count:
+            summary[column] = {"count": 0, "mean": None, "min": None, "max": None, "trend_per_day": None}
+            continue
+        days = [bucket for bucket in in_window if bucket[f"{prefix}_count"]]
+        points = [
+            ((date.fromisoformat(str(bucket["day"])[:10]) - start).days,
+             bucket[f"{prefix}_sum"] / bucket[f"{prefix}_count"])
+            for bucket in days
+        ]
+        slope = trend_per_day(points)
+        summary[column] = {
+            "count": count,
+            "mean": round(sum(bucket[f"{prefix}_sum"] for bucket in days) / count, 2),
+            "min": min(bucket[f"{prefix}_min"] for bucket in days),
+            "max": max(bucket[f"{prefix}_max"] for bucket in days),
+            "trend_per_day": round(slope, 3) if slope is not None else None,
+        }
+    return summary
+
+class VitalsAggregator:
+    """Keeps vitals_daily current as readings are inserted
+
+    Buckets are updated with a compare-and-set on ``version`` (the same
+    pattern as the outbox and adherence counters).
+    """
+
+    def __init__(self, supabase):  # async data client (see data_client.py)
+        self.supabase = supabase
+        self.readings = 0
+        self.conflicts = 0
+
+    async def record(self, vitals: List[dict]):
+        """Fold inserted vitals rows into their daily buckets, one update per (user, day)"""
+        for key, partial in bucket_readings(vitals).items():
+            await self._merge(key, partial)
+        self.readings += len(vitals)
+
+    async def _merge(self, key: Tuple[int, str], partial: dict):
+        user_id, day = key
+        for _ in range(VITALS_AGGREGATE_MAX_RETRIES):
+            rows = (
+                await self.supabase.table("vitals_daily")
+                .select("*")
+                .eq("user_id", user_id)
+                .eq("day", day)
+                .execute()
+            ).data
+            current = rows[0] if rows else empty_bucket(user_id, day)
+            updated = merge_bucket(current, partial)
+            updated["version"] = current["version"] + 1
+            updated["updated_at"] = datetime.utcnow().isoformat()
+
+            if not rows:
+                try:
+                    await self.supabase.table("vitals_daily").insert(updated).execute()
+                    return
+                except Exception:
+                    self.conflicts += 1  # another insert created the bucket first
+                    continue
+
+            changes = {k: v for k, v in updated.items() if k not in ("user_id", "day")}
+            result = (
+                await self.supabase.table("vitals_daily")
+                .update(changes)
+                .eq("user_id", user_id)
+                .eq("day", day)
+                .eq("version", current["version"])
+                .execute()
+            )
+            if result.data:
+                return
+            self.conflicts += 1
+        raise RuntimeError(f"Could not update vitals aggregates for user {user_id} ({day})")
+
+    async def summary(self, user_id: int, windows: Iterable[int] = SUMMARY_WINDOWS,
+                      today: Optional[date] = None) -> dict:
+        """Rolling summaries for each window, from one query of at most max(windows) buckets"""
+        windows = sorted(set(windows))
+        today = today or datetime.utcnow().date()
+        start = today - timedelta(days=windows[-1] - 1)
+        buckets = (
+            await self.supabase.table("vitals_daily")
+            .select("*")
+            .eq("user_id", user_id)
+            .gte("day", start.isoformat())
+            .order("day")
+            .execute()
+        ).data or []
+        return {f"{window}d": summarize(buckets, window, today) for window in windows}
+
+    def stats(self) -> dict:
+        return {"readings": self.readings, "conflicts": self.conflicts}
@@ -0,0 +1,276 @@
+"""
+HealthMate AI Guardian - Vitals anomaly detection
+Checks every stored reading against clinical thresholds and against the
+user's own baseline: an exponentially weighted mean and variance per vital,
+updated in constant time per reading. Baselines live in a bounded in-process
+cache, warmed at startup by a vectorized pass over recent vitals (streamed in
+chronological pages, so memory grows with users rather than readings) and
+hydrated from the user's history on a cache miss.
+
+Readings older than the newest one already in a baseline (e.g. a device
+syncing a backlog through /vitals/stream) are still checked against the
+clinical thresholds, but are neither scored against nor folded into the
+baseline, which has moved on since they were taken.
+"""
+
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from caching import TTLCache
+from notifications import parse_timestamp
+
+# Load environment variables
+load_dotenv()
+
+VITALS_ANOMALY_HALF_LIFE = float(os.getenv("VITALS_ANOMALY_HALF_LIFE", "20"))  # readings
+VITALS_ANOMALY_Z = float(os.getenv("VITALS_ANOMALY_Z", "3"))
+VITALS_ANOMALY_MIN_READINGS = int(os.getenv("VITALS_ANOMALY_MIN_READINGS", "5"))
+VITALS_ANOMALY_CACHE_SIZE = int(os.getenv("VITALS_ANOMALY_CACHE_SIZE", "10000"))
+# Re-hydrate baselines periodically so readings stored by other workers are picked up
+VITALS_ANOMALY_CACHE_TTL = float(os.getenv("VITALS_ANOMALY_CACHE_TTL", "3600"))
+VITALS_ANOMALY_HISTORY = int(os.getenv("VITALS_ANOMALY_HISTORY", "200"))
+VITALS_ANOMALY_BACKFILL_DAYS = int(os.getenv("VITALS_ANOMALY_BACKFILL_DAYS", "30"))  # 0 disables the warm-up
+VITALS_ANOMALY_PAGE_SIZE = int(os.getenv("VITALS_ANOMALY_PAGE_SIZE", "1000"))
+
+# vitals column -> (label, unit, clinical low, clinical high, smallest baseline std used)
+VITAL_RULES = {
+    "blood_pressure_systolic": ("Systolic blood pressure", "mmHg", 90, 180, 5.0),
+    "blood_pressure_diastolic": ("Diastolic blood pressure", "mmHg", 60, 120, 4.0),
+    "blood_sugar": ("Blood sugar", "mg/dL", 70, 250, 10.0),
+    "sleep_hours": ("Sleep", "hours", 3, 14, 0.75),
+}
+VITAL_COLUMNS = list(VITAL_RULES)
+
+DECAY = 0.5 ** (1 / VITALS_ANOMALY_HALF_LIFE)
+EPOCH = datetime(1970, 1, 1)
+
+# Per vital: [decayed weight, decayed sum, decayed sum of squares, readings seen,
+#             created_at of the newest reading folded in (UTC epoch seconds)]
+Baseline = Dict[str, List[float]]
+
+def reading_time(created_at: str) -> float:
+    return (parse_timestamp(created_at) - EPOCH).total_seconds()
+
+def empty_baseline() -> Baseline:
+    return {column: [0.0, 0.0, 0.0, 0, -math.inf] for column in VITAL_COLUMNS}
+
+def update_baseline(state: List[float], value: float, taken_at: float):
+    state[0] = DECAY * state[0] + 1
+    state[1] = DECAY * state[1] + value
+    state[2] = DECAY * state[2] + value * value
+    state[3] += 1
+    state[4] = max(state[4], taken_at)
+
+def last_reading_time(baseline: Baseline) -> float:
+    return max(state[4] for state in baseline.values())
+
+def merge_baseline(older: Baseline, newer: Baseline) -> Baseline:
+    """One baseline from two built over consecutive runs of readings, older run first"""
+    merged = {}
+    for column in VITAL_COLUMNS:
+        old, new = older[column], newer[column]
+        decay = DECAY ** new[3]  # every older reading ages by the newer run's length
+        merged[column] = [
+            old[0] * decay + new[0], old[1] * decay + new[1], old[2] * decay + new[2],
+            old[3] + new[3], max(old[4], new[4]),
+        ]
+    return merged
+
+def mean_std(state: List[float]) -> Tuple[float, float]:
+    weight, total, squares = state[:3]
+    mean = total / weight
+    return mean, math.sqrt(max(squares / weight - mean * mean, 0.0))
+
+def check_reading(baseline: Baseline, vital: dict) -> List[dict]:
+    """Anomalies in one reading, then fold it into the baseline
+
+    Readings older than the baseline's newest one only get the threshold check.
+    """
+    taken_at = reading_time(vital["created_at"])
+    in_order = taken_at >= last_reading_time(baseline)
+    anomalies = []
+    for column, (_, _, low, high, std_floor) in VITAL_RULES.items():
+        value = vital.get(column)
+        if value is None:
+            continue
+        state = baseline[column]
+        anomaly = None
+        if value < low or value > high:
+            anomaly = {"kind": "threshold", "bound": low if value < low else high, "urgent": True}
+        elif in_order and state[3] >= VITALS_ANOMALY_MIN_READINGS:
+            mean, std = mean_std(state)
+            z = (value - mean) / max(std, std_floor)
+            if abs(z) >= VITALS_ANOMALY_Z:
+                anomaly = {"kind": "baseline", "baseline_mean": round(mean, 1), "z": round(z, 1), "urgent": False}
+        if anomaly:
+            anomalies.append({
+                "user_id": vital["user_id"],
+                "vital_id": vital.get("id"),
+                "metric": column,
+                "value": value,
+                "created_at": vital.get("created_at"),
+                **anomaly,
+            })
+        if in_order:
+            update_baseline(state, value, taken_at)
+    return anomalies
+
+def build_baselines(user_ids: np.ndarray, values: Dict[str, np.ndarray], taken_at: np.ndarray) -> Dict[int, Baseline]:
+    """Baselines for many users at once from readings in chronological order
+
+    Equivalent to calling update_baseline on every reading: a reading that is
+    followed by ``age`` newer readings of the same vital weighs DECAY ** age.
+    """
+    baselines: Dict[int, Baseline] = {}
+    if not len(user_ids):
+        return baselines
+    users, inverse = np.unique(user_ids, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    for user_id in users.tolist():
+        baselines[user_id] = empty_baseline()
+
+    for column in VITAL_COLUMNS:
+        column_values = values[column]
+        present = ~np.isnan(column_values)
+        groups = inverse[present]
+        x = column_values[present]
+        if not len(x):
+            continue
+        counts = np.bincount(groups, minlength=len(users))
+        # Position of each reading among its user's readings, oldest first
+        order = np.argsort(groups, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        position = np.empty(len(x), dtype=np.int64)
+        position[order] = np.arange(len(x)) - starts[groups[order]]
+        weights = DECAY ** (counts[groups] - 1 - position)
+
+        weight = np.bincount(groups, weights=weights, minlength=len(users))
+        total = np.bincount(groups, weights=weights * x, minlength=len(users))
+        squares = np.bincount(groups, weights=weights * x * x, minlength=len(users))
+        latest = np.full(len(users), -np.inf)
+        np.maximum.at(latest, groups, taken_at[present])
+        for index in np.flatnonzero(counts).tolist():
+            baselines[users[index].item()][column] = [
+                weight[index].item(), total[index].item(), squares[index].item(), int(counts[index]),
+                latest[index].item(),
+            ]
+    return baselines
+
+def rows_to_arrays(rows: List[dict]) -> Tuple[np.ndarray, Dict[str, np.ndarray], np.ndarray]:
+    user_ids = np.array([row["user_id"] for row in rows], dtype=np.int64)
+    values = {
+        column: np.array([row.get(column) for row in rows], dtype=np.float64)  # None -> nan
+        for column in VITAL_COLUMNS
+    }
+    taken_at = np.array([reading_time(row["created_at"]) for row in rows], dtype=np.float64)
+    return user_ids, values, taken_at
+
+class VitalsAnomalyDetector:
+    """Per-user vitals baselines and the anomaly check run on every insert"""
+
+    def __init__(
+        self,
+        supabase,  # async data client (see data_client.py)
+        cache_size: int = VITALS_ANOMALY_CACHE_SIZE,
+        cache_ttl: float = VITALS_ANOMALY_CACHE_TTL,
+    ):
+        self.supabase = supabase
+        self.baselines = TTLCache(cache_size, cache_ttl)
+        self.warmed_users = 0
+        self.hydrations = 0
+        self.readings = 0
+        self.backdated = 0
+        self.anomalies = 0
+
+    async def observe(self, vitals: List[dict]) -> List[dict]:
+        """Check stored vitals rows (oldest first per user) and update the baselines"""
+        by_user: Dict[int, List[dict]] = {}
+        for vital in sorted(vitals, key=lambda row: str(row.get("created_at"))):
+            by_user.setdefault(vital["user_id"], []).append(vital)
+
+        anomalies = []
+        for user_id, readings in by_user.items():
+            baseline = self.baselines.get(user_id)
+            if baseline is None:
+                baseline = await self.hydrate(user_id, exclude_ids={row.get("id") for row in readings})
+            for vital in readings:
+                if reading_time(vital["created_at"]) < last_reading_time(baseline):
+                    self.backdated += 1
+                anomalies += check_reading(baseline, vital)
+        self.readings += len(vitals)
+        self.anomalies += len(anomalies)
+        return anomalies
+
+    async def hydrate(self, user_id: int, exclude_ids=frozenset()) -> Baseline:
+        """Build a user's baseline from their latest readings, excluding ones being checked"""
+        rows = (
+            await self.supabase.table("vitals")
+            .select("id,user_id,created_at," + ",".join(VITAL_COLUMNS))
+            .eq("user_id", user_id)
+            .order("created_at", desc=True)
+            .limit(VITALS_ANOMALY_HISTORY + len(exclude_ids))
+            .execute()
+        ).data or []
+        rows = [row for row in reversed(rows) if row["id"] not in exclude_ids][-VITALS_ANOMALY_HISTORY:]
+        # Another request may have hydrated this user while we waited
+        baseline = self.baselines.get(user_id)
+        if baseline is None:
+            baseline = build_baselines(*rows_to_arrays(rows)).get(user_id) or empty_baseline()
+            self.baselines.put(user_id, baseline)
+            self.hydrations += 1
+        return baseline
+
+    async def warm(self, days: int = VITALS_ANOMALY_BACKFILL_DAYS):
+        """Backfill baselines for users with readings in the last ``days`` days
+
+        Pages through vitals oldest first on (created_at, id) and folds each
+        page into the running baselines, so only one page is held at a time.
+        """
+        if days <= 0:
+            return
+        since = (datetime.utcnow() - timedelta(days=days)).isoformat()
+        baselines: Dict[int, Baseline] = {}
+        scanned = 0
+        last = None
+        while True:
+            query = (
+                self.supabase.table("vitals")
+                .select("id,user_id,created_at," + ",".join(VITAL_COLUMNS))
+                .gte("created_at", since)
+            )
+            if last:
+                # The pinned postgrest builder has no or_(), so the seek is added as a raw param
+                created_at, row_id = last["created_at"], last["id"]
+                query.params = query.params.add(
+                    "or", f'(created_at.gt."{created_at}",and(created_at.eq."{created_at}",id.gt.{row_id}))'
+                )
+            page = (
+                await query.order("created_at").order("id").limit(VITALS_ANOMALY_PAGE_SIZE).execute()
+            ).data or []
+            if not page:
+                break
+            for user_id, partial in build_baselines(*rows_to_arrays(page)).items():
+                baselines[user_id] = merge_baseline(baselines[user_id], partial) if user_id in baselines else partial
+            scanned += len(page)
+            last = page[-1]
+
+        # Most recently active users last, so they survive the LRU cap
+        for user_id in sorted(baselines, key=lambda user_id: last_reading_time(baselines[user_id])):
+            if user_id not in self.baselines:  # never overwrite a live baseline
+                self.baselines.put(user_id, baselines[user_id])
+                self.warmed_users += 1
+        print(f"📈 Vitals baselines warmed for {len(baselines)} users from {scanned} readings")
+
+    def stats(self) -> dict:
+        return {
+            "readings": self.readings,
+            "backdated": self.backdated,
+            "anomalies": self.anomalies,
+            "warmed_users": self.warmed_users,
+            "hydrations": self.hydrations,
+            "baselines": self.baselines.stats(),
+        }
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+HealthMate AI Guardian - Pagination Test
+Pages through a user's vitals with the real PostgREST query builder against
+an in-memory PostgREST stand-in, checking that the cursor reaches page 2 and
+that every row is returned exactly once.
+
+Usage:
+    python -m pytest test_pagination.py
+    python test_pagination.py
+"""
+
+import asyncio
+import re
+import sys
+
+import httpx
+from postgrest import AsyncPostgrestClient
+
+sys.path.append('backend')
+from pagination import PAGE_SIZE_MAX, paginate, split_page
+
+# 25 vitals for user 1, several sharing a created_at so the id tie-break matters
+ROWS = [
+    {"id": i, "user_id": 1, "blood_sugar": 100.0 + i, "created_at": f"2024-01-01T00:00:{i // 3:02d}+00:00"}
+    for i in range(1, 26)
+]
+
+OR_CURSOR = re.compile(r'\(created_at\.lt\."(.+?)",and\(created_at\.eq\."(.+?)",id\.lt\.(\d+)\)\)')
+
+def postgrest_handler(request: httpx.Request) -> httpx.Response:
+    """Answer a vitals select the way PostgREST would for the filters paginate() uses"""
+    params = request.url.params
+    user_id = int(params["user_id"].split(".", 1)[1])
+    rows = [row for row in ROWS if row["user_id"] == user_id]
+    if "or" in params:
+        match = OR_CURSOR.fullmatch(params["or"])
+        assert match, f"unexpected or filter: {params['or']}"
+        created_at, _, row_id = match.groups()
+        rows = [row for row in rows
+                if row["created_at"] < created_at or (row["created_at"] == created_at and row["id"] < int(row_id))]
+    rows.sort(key=lambda row: (row["created_at"], row["id"]), reverse=True)
+    return httpx.Response(200, json=rows[:int(params["limit"])])
+
+async def fetch_all_pages(limit: int):
+    client = AsyncPostgrestClient("http://postgrest.test")
+    client.session = httpx.AsyncClient(base_url="http://postgrest.test",
+                                       transport=httpx.MockTransport(postgrest_handler))
+    pages = []
+    cursor = None
+    try:
+        while True:
+            query = paginate(client.from_("vitals").select("*").eq("user_id", 1), limit, cursor)
+            rows, cursor = split_page((await query.execute()).data, limit)
+            pages.append(rows)
+            if not cursor:
+                return pages
+    finally:
+        await client.aclose()
+
+def test_second_page():
+    """The cursor from page 1 fetches page 2 without gaps or repeats"""
+    pages = asyncio.run(fetch_all_pages(10))
+    assert [len(page) for page in pages] == [10, 10, 5]
+    ids = [row["id"] for page in pages for row in page]
+    assert ids == sorted((row["id"] for row in ROWS), reverse=True)
+
+def test_page_size_below_server_cap():
+    """limit + 1 look-ahead rows must fit under Supabase's 1000-row cap"""
+    assert PAGE_SIZE_MAX + 1 <= 1000
+
+if __name__ == "__main__":
+    test_second_page()
+    test_page_size_below_server_cap()
+    print("✅ Pagination tests passed")